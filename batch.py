@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Resets several devices at once, without a window.
+
+The job list is a CSV file with a header row and the columns `port`, `baud`
+and `device`, where device is one of the supported devices (for example
+`cisco/sw45xx`). Every job runs concurrently and a summary of the results
+is written once all of them have finished.
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import serial
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from bits import metrics
+from bits import transcript
+from bits.aio import run_sync
+from bits.expect import ExpectTimeout
+from devices import devices
+from devices.AsyncBase import AsyncBase
+
+
+def load_jobs(path):
+    supported = [x.replace('.', '/', 1) for x in devices.names()]
+    jobs = []
+
+    with open(path, newline='') as fh:
+        rows = csv.DictReader(line for line in fh if not line.startswith('#'))
+
+        for row in rows:
+            device = row['device'].strip().replace('.', '/')
+
+            if device not in supported:
+                raise LookupError('Device "%s" not supported' % device)
+
+            jobs.append({
+                'port': row['port'].strip(),
+                'baud': int(row['baud']),
+                'device': device,
+            })
+
+    return jobs
+
+
+async def run_job(job, executor, recorders, transcripts, speed_up=False):
+    result = dict(job, status='ok', error=None)
+    started = time.monotonic()
+    result['started'] = time.time()
+
+    try:
+        port = serial.Serial(job['port'], job['baud'])
+    except serial.SerialException as ex:
+        result.update(status='error', error=str(ex), elapsed=0.0)
+        return result
+
+    try:
+        device = devices.get(job['device'].replace('/', '.'))()
+        device.transcripts = transcripts
+        device.speedUp = speed_up
+        recorders.append(device.metrics)
+
+        if isinstance(device, AsyncBase):
+            await device.start(port)
+        else:
+            await run_sync(device, port, executor)
+    except ExpectTimeout as ex:
+        result.update(status='timeout', error=str(ex))
+    except (Exception, SystemExit) as ex:
+        result.update(status='failed', error='%s: %s' % (
+            ex.__class__.__name__, ex))
+    finally:
+        port.close()
+
+    result['elapsed'] = round(time.monotonic() - started, 3)
+    logging.info('%s (%s): %s', job['port'], job['device'], result['status'])
+
+    return result
+
+
+async def run_jobs(jobs, recorders, transcripts, speed_up=False):
+    # Synchronous scripts block a thread each for their whole run
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+        return await asyncio.gather(*[
+            run_job(x, executor, recorders, transcripts, speed_up)
+            for x in jobs])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('jobs', help='CSV file of port,baud,device')
+    parser.add_argument('-o', '--output', help='write the summary as JSON')
+    parser.add_argument('-m', '--metrics', metavar='DIR',
+                        help='append step events to DIR/steps.jsonl and '
+                             'write DIR/killswitch.prom')
+    parser.add_argument('-t', '--transcripts', metavar='DIR',
+                        default=transcript.DIRECTORY,
+                        help='record session transcripts to DIR (default: '
+                             'transcripts in the user data directory, '
+                             '%(default)s)')
+    parser.add_argument('-f', '--speed-up', action='store_true',
+                        help='switch consoles to the fastest rate the model '
+                             'supports, where the script can')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(name)s: %(message)s')
+
+    recorders = []
+    results = asyncio.run(run_jobs(load_jobs(args.jobs), recorders,
+                                   args.transcripts, args.speed_up))
+
+    if args.metrics:
+        os.makedirs(args.metrics, exist_ok=True)
+        metrics.write_jsonl(os.path.join(args.metrics, 'steps.jsonl'),
+                            recorders)
+        metrics.write_prometheus(
+            os.path.join(args.metrics, 'killswitch.prom'), recorders)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    for result in results:
+        print('%-16s %-16s %-8s %8.1fs %s' % (
+            result['port'], result['device'], result['status'],
+            result['elapsed'], result['error'] or ''))
+
+    return 0 if all(x['status'] == 'ok' for x in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
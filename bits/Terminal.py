@@ -1,6 +1,8 @@
 import wx
-import re
 import math
+import time
+from array import array
+from threading import Lock
 from wx.lib.scrolledpanel import ScrolledPanel
 
 
@@ -30,131 +32,211 @@ class _TextSelection:
         return True
 
 
-class _LineBuffer:
-    _contents = None
-    _wrap = False
-    _limit = 80
-    _lines = None
+class _Fenwick:
+    """
+    Prefix sums over a list of counts that grows at the end, with O(log n)
+    updates, sums and searches.
+    """
 
-    def __init__(self, contents=''):
-        self._contents = contents
-        self._lines = []
+    def __init__(self, values=()):
+        # 1-based; node k covers the k & -k values ending at value k. An
+        # array, as most nodes are sums too large to be shared int objects
+        self._tree = array('q', [0])
+        self._tree.extend(values)
 
-        self._process()
+        for k in range(1, len(self._tree)):
+            parent = k + (k & -k)
 
-    def __str__(self):
-        return self._contents
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[k]
 
-    def __getitem__(self, key):
-        return self._contents[key]
+    def __len__(self):
+        return len(self._tree) - 1
 
-    def __setitem__(self, key, value):
-        self._contents[key] = value
-        self._process()
+    def append(self, value):
+        k = len(self._tree)
+        self._tree.append(value + self.prefix(k - 1) - self.prefix(k - (k & -k)))
 
-    def __delitem__(self, key):
-        del self._contents[key]
-        self._process()
+    def pop(self):
+        k = len(self._tree) - 1
+        value = self.prefix(k) - self.prefix(k - 1)
 
-    def __contains__(self, item):
-        return item in self._contents
+        # No other node covers the last value
+        self._tree.pop()
 
-    def __len__(self):
-        return len(self._contents)
+        return value
 
-    def __add__(self, value):
-        buff = self()
-        buff._contents = self._contents + value
-        buff._process()
+    def add(self, i, delta):
+        k = i + 1
 
-        return buff
+        while k < len(self._tree):
+            self._tree[k] += delta
+            k += k & -k
 
-    def __radd__(self, value):
-        buff = self()
-        buff._contents = value + self._contents
-        buff._process()
+    def prefix(self, i):
+        """
+        Sum of the first `i` values.
+        """
+        total = 0
 
-        return buff
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
 
-    def __iadd__(self, value):
-        self._contents += value
-        self._process()
+        return total
 
-        return self
+    def total(self):
+        return self.prefix(len(self))
 
-    def __iter__(self):
-        self.n = 0
-        return self
+    def search(self, target):
+        """
+        Index of the value the running sum passes `target` in, or the number
+        of values if it never does.
+        """
+        pos = 0
+        step = 1 << (len(self).bit_length() - 1) if len(self) else 0
 
-    def __next__(self):
-        if self.n >= len(self._lines):
-            raise StopIteration
+        while step:
+            if pos + step < len(self._tree) and \
+                    self._tree[pos + step] <= target:
+                pos += step
+                target -= self._tree[pos]
 
-        last = self.n
-        self.n += 1
+            step >>= 1
 
-        return self._lines[last]
+        return pos
 
-    def GetWrap(self):
-        return self._wrap
 
-    def SetWrap(self, wrap):
-        self._wrap = wrap
+class _TextStore:
+    """
+    Text that changes only at its end, kept in blocks of `blockSize`
+    characters, so that writing or truncating copies no more than a block.
+    Offsets carry on from the text discarded from the start.
+    """
+    blockSize = 4096
 
-        self._process()
+    def __init__(self):
+        self._blocks = ['']
 
-    def GetLimit(self):
-        return self._limit
+        # Offset of the first block kept
+        self._base = 0
 
-    def SetLimit(self, limit):
-        self._limit = limit
+    def end(self):
+        return self._base + (len(self._blocks) - 1) * self.blockSize + \
+            len(self._blocks[-1])
 
-        self._process()
+    def write(self, text):
+        while text:
+            room = self.blockSize - len(self._blocks[-1])
 
-    def _process(self):
-        if not self.GetWrap():
-            return
+            if not room:
+                self._blocks.append('')
+                continue
 
-        limit = self.GetLimit()
-        self._lines = []
+            self._blocks[-1] += text[:room]
+            text = text[room:]
+
+    def read(self, start, length):
+        if length <= 0:
+            return ''
+
+        block, offset = divmod(start - self._base, self.blockSize)
+
+        # Most reads are within a block
+        if offset + length <= self.blockSize:
+            return self._blocks[block][offset:offset + length]
+
+        parts = []
 
-        lineLen = len(self._contents.rstrip())
+        while length > 0:
+            part = self._blocks[block][offset:offset + length]
+            parts.append(part)
+            length -= len(part)
+            block += 1
+            offset = 0
 
-        for i in range(math.ceil(lineLen/limit)):
-            start = i * limit
-            end = min((i + 1) * limit, lineLen)
+        return ''.join(parts)
 
-            self._lines.append(self._contents[start:end])
+    def truncate(self, end):
+        block, offset = divmod(end - self._base, self.blockSize)
+        del self._blocks[block + 1:]
 
-        # This was just an empty line
-        if not self._lines:
-            self._lines = ['']
+        if block < len(self._blocks):
+            self._blocks[block] = self._blocks[block][:offset]
+
+    def discard(self, end):
+        """
+        Drops the blocks that end before `end`.
+        """
+        count = min((end - self._base) // self.blockSize,
+                    len(self._blocks) - 1)
+
+        del self._blocks[:count]
+        self._base += count * self.blockSize
 
 
 class _TextBuffer:
+    """
+    Received text, split into lines for display.
+
+    The text is kept in a single store, and each line as its offset in the
+    store, its length and its length without trailing whitespace (what is
+    wrapped) in arrays. Wrapped rows are sliced from the store when asked
+    for, as a line of length n has max(1, ceil(n / limit)) rows.
+
+    Scrollback is bounded to `maxLines` lines and, if set, `maxChars`
+    characters; the oldest lines are dropped as new ones arrive. Indexes
+    are relative to the oldest line kept, so they shift down when lines are
+    dropped; `GetEvicted` counts the characters dropped so far.
+
+    The rows and characters of each line are summed in Fenwick trees, so
+    rows, indexes and lines map to each other in O(log n), and appends only
+    update the lines they touch.
+    """
+    maxLines = 10000
+    maxChars = None
+
     _contents = None
+    _length = 0
+    _evicted = 0
+    _evictedRows = 0
+    _changedRow = 1
     _wrap = False
-    _lines = None
     _limit = 80
     _selection = _TextSelection()
-    _c2iCache = {}
-    _i2cCache = {}
-    _numRows = None
 
-    _re_esc = None
+    # Lines before _head have been dropped; their counts are zero
+    _head = 0
+    _rows = None
+    _chars = None
 
-    def __init__(self, contents=''):
-        self._re_esc = re.compile('\b')
+    # The text store, and the offset, length and wrapped length of each line
+    _store = None
+    _starts = None
+    _lengths = None
+    _widths = None
+
+    # As with SetScrollback, None is no limit; the defaults are the class's
+    def __init__(self, contents='', maxLines=maxLines, maxChars=maxChars):
+        self.maxLines = maxLines
+        self.maxChars = maxChars
 
         self._contents = contents
-        self._lines = []
         self._process()
 
     def __str__(self):
+        # Read on demand, as appends only touch the store
+        if self._contents is None:
+            if self.GetNumLines():
+                self._contents = self._store.read(self._starts[self._head],
+                                                  self._length)
+            else:
+                self._contents = ''
+
         return self._contents
 
     def __getitem__(self, key):
-        return self._contents[key]
+        return str(self)[key]
 
     def __setitem__(self, key, value):
         self._contents[key] = value
@@ -165,10 +247,10 @@ class _TextBuffer:
         self._process()
 
     def __contains__(self, item):
-        return item in self._contents
+        return item in str(self)
 
     def __len__(self):
-        return len(self._contents)
+        return self._length
 
     def __add__(self, value):
         buff = self()
@@ -187,23 +269,22 @@ class _TextBuffer:
         return buff
 
     def __iadd__(self, value):
-        self._contents += value
-        self._process()
+        self._append(value)
 
         return self
 
     def __iter__(self):
-        self.n = 0
+        self.n = self._head
         return self
 
     def __next__(self):
-        if self.n >= len(self._lines):
+        if self.n >= len(self._starts):
             raise StopIteration
 
         last = self.n
         self.n += 1
 
-        return self._lines[last]
+        return self._getLine(last)
 
     def GetWrap(self):
         return self._wrap
@@ -214,7 +295,6 @@ class _TextBuffer:
 
         self._wrap = wrap
         self.InvalidateCache()
-        self._updateLines()
 
     def GetLimit(self):
         return self._limit
@@ -225,7 +305,6 @@ class _TextBuffer:
 
         self._limit = limit
         self.InvalidateCache()
-        self._updateLines()
 
     def GetSelection(self):
         return self._selection
@@ -245,174 +324,280 @@ class _TextBuffer:
         self._selection.SetEnd(end)
 
     def GetNumLines(self):
-        return len(self._lines)
+        return len(self._starts) - self._head
 
-    def GetNumRows(self):
-        if self._numRows is None:
-            rows = 0
+    def GetTrimmedLength(self):
+        """
+        Returns the length of the text without trailing whitespace, from the
+        line lengths alone.
+        """
+        length = self._length
+        line = len(self._starts) - 1
 
-            for line in self._lines:
-                for wrap in line:
-                    rows += 1
+        # Only lines that are all whitespace are passed over
+        while line >= self._head:
+            length -= self._lengths[line] - self._widths[line]
 
-            self._numRows = rows
+            if self._widths[line]:
+                break
 
-        return self._numRows
+            line -= 1
 
-    def GetLineForRow(self, row):
-        lineNo = 1
+        return length
 
-        for line in self._lines:
-            for wrap in line:
-                if row == lineNo:
-                    return wrap
+    def GetEvicted(self):
+        return self._evicted
 
-                lineNo += 1
+    def GetEvictedRows(self):
+        return self._evictedRows
 
-    def InvalidateCache(self):
-        self._numRows = None
-        self._c2iCache = {}
-        self._i2cCache = {}
+    def GetChangedRow(self):
+        """
+        Returns the first row changed by the last text added. The rows
+        before it are as they were, less any evicted.
+        """
+        return self._changedRow
 
-    def _process(self):
-        self.InvalidateCache()
-        self._processText()
-        self._processLines()
+    def SetScrollback(self, maxLines=None, maxChars=None):
+        self.maxLines = maxLines
+        self.maxChars = maxChars
 
-    def _processText(self):
-        contents = self._contents
-        index = 0
+        self._evict()
 
-        while 1:
-            index = self._re_esc.search(contents, index)
+    def GetNumRows(self):
+        return self._rows.total()
 
-            if index is None:
-                break
+    def _findRow(self, row):
+        """
+        Returns the line holding the 1-based `row`, and the row's number
+        within it.
+        """
+        line = self._rows.search(row - 1)
 
-            index = index.span()[0]
+        return line, row - 1 - self._rows.prefix(line)
 
-            # Backspace character
-            if contents[index] == '\b':
-                contents = contents[:index-1] + contents[index+1:]
-                index -= 1
+    def _countRows(self, width):
+        if not self.GetWrap():
+            return 0
 
-        self._contents = contents
+        # An empty line still takes a row
+        return max(1, math.ceil(width / self.GetLimit()))
+
+    def _getRow(self, line, wrap):
+        start = wrap * self.GetLimit()
+        length = min(self.GetLimit(), self._widths[line] - start)
+
+        return self._store.read(self._starts[line] + start, length)
+
+    def _getLine(self, line):
+        return self._store.read(self._starts[line], self._lengths[line])
 
-    def _processLines(self):
-        del self._lines
-        self._lines = []
+    def GetLineForRow(self, row):
+        if not 0 < row <= self.GetNumRows():
+            return None
+
+        return self._getRow(*self._findRow(row))
 
-        for line in self._contents.splitlines(True):
-            lineObj = _LineBuffer(line)
-            self._lines.append(lineObj)
+    def GetRows(self, first, last):
+        """
+        Yields the text of the 1-based rows `first` to `last`, inclusive.
+        """
+        first = max(1, first)
+        last = min(last, self.GetNumRows())
 
-        self._updateLines()
+        if first > last:
+            return
+
+        line, wrap = self._findRow(first)
+        count = last - first + 1
 
-    def _updateLines(self):
-        wrap = self.GetWrap()
         limit = self.GetLimit()
 
-        for line in self._lines:
-            line.SetWrap(wrap)
-            line.SetLimit(limit)
+        while count:
+            numRows = self._countRows(self._widths[line])
+            text = self._getLine(line)[:self._widths[line]]
 
-    def CursorToIndex(self, col, row):
-        index = 0
-        lineNo = 0
-        numRows = self.GetNumRows()
+            for row in range(wrap, min(numRows, wrap + count)):
+                yield text[row * limit:(row + 1) * limit]
+                count -= 1
 
-        assert row > 0, 'Row "%d" below one' % row
-        assert row <= numRows, 'Row "%d" greater than total rows %d' % \
-                               (row, numRows)
-        assert col >= 0, 'Column "%d" invalid' % col
+            line += 1
+            wrap = 0
 
-        # Caching!
-        if "%d-%d" % (col, row) in self._c2iCache:
-            return self._c2iCache["%d-%d" % (col, row)]
+    def InvalidateCache(self):
+        # Rows are counted when lines are added, or rewrapped
+        self._rows = _Fenwick(
+            self._countRows(x) if i >= self._head else 0
+            for i, x in enumerate(self._widths))
+        self._chars = _Fenwick(
+            x if i >= self._head else 0
+            for i, x in enumerate(self._lengths))
 
-        for i in range(len(self._lines)):
-            lineLen = len(str(self._lines[i]))
+    def _process(self):
+        contents = str(self)
+
+        self._store = _TextStore()
+        self._starts = array('Q')
+        self._lengths = array('I')
+        self._widths = array('I')
+        self._head = 0
+        self._length = 0
+        self.InvalidateCache()
+        self._append(contents)
+
+    def _pop(self):
+        start = self._starts.pop()
+        length = self._lengths.pop()
+        self._widths.pop()
+        self._rows.pop()
+        self._chars.pop()
+        self._length -= length
+
+        line = self._store.read(start, length)
+        self._store.truncate(start)
+
+        return line
+
+    def _push(self, line):
+        width = len(line.rstrip())
+
+        self._starts.append(self._store.end())
+        self._lengths.append(len(line))
+        self._widths.append(width)
+        self._store.write(line)
+
+        self._rows.append(self._countRows(width))
+        self._chars.append(len(line))
+        self._length += len(line)
+
+    def _append(self, chars):
+        """
+        Adds received text, touching only the last line, which may still be
+        unterminated, and the lines after it.
+        """
+        text = ''
+        erase = 0
+
+        # Backspaces remove the character before them, which may have been
+        # received earlier
+        for i, part in enumerate(chars.split('\b')):
+            if i > 0:
+                if text:
+                    text = text[:-1]
+                else:
+                    erase += 1
 
-            for wrap in self._lines[i]:
-                wrapLen = len(wrap)
-                lineLen -= wrapLen
-                lineNo += 1
+            text += part
 
-                if not lineNo == row:
-                    index += wrapLen
-                    continue
+        tail = ''
 
-                m = min(col, wrapLen)
-                index += m
-                lineLen -= m
-                break
+        while self.GetNumLines():
+            line = self._pop()
 
-            if lineNo == row:
+            removed = min(erase, len(line))
+            tail = line[:len(line) - removed] + tail
+            erase -= removed
+
+            # The last line is always re-split with the new text, in case it
+            # was unterminated; earlier ones only if backspaces reach them
+            if not erase:
                 break
-            else:
-                index += lineLen
-        else:
-            raise RuntimeError('Reached end of buffer')
 
-        self._c2iCache["%d-%d" % (col, row)] = index
+        text = tail + text
 
-        return index
+        # Or if the new text is the \n of a \r\n split across chunks
+        if text.startswith('\n') and self.GetNumLines() and \
+                self._getLine(-1).endswith('\r'):
+            text = self._pop() + text
 
-    def IndexToCursor(self, index):
-        row = 1
-        col = 0
-        counted = 0         # Number of indexes counted
-        limit = self.GetLimit()
+        self._contents = None
 
-        assert index >= 0, 'Invalid index position "%d".' % index
-        assert index <= len(self), 'Invalid index position "%d".' % index
+        changed = self._rows.total() + 1
+        evicted = self._evictedRows
 
-        # Caching!
-        if index in self._i2cCache:
-            return self._i2cCache[index]
+        for line in text.splitlines(True):
+            self._push(line)
 
-        for lineNo in range(len(self._lines)):
-            lineLen = len(self._lines[lineNo])
-            lineEnd = lineLen - len(str(self._lines[lineNo]).rstrip())
+        self._evict()
+        self._changedRow = max(1, changed - (self._evictedRows - evicted))
 
-            # If index is beyond this line, add and skip
-            if counted + lineLen < index:
-                counted += lineLen
+    def _evict(self):
+        evicted = 0
 
-                if (self.GetWrap()):
-                    numLines = math.ceil((lineLen - lineEnd) / limit)
+        # The last line is kept, however long
+        while self.GetNumLines() > 1 and (
+                (self.maxLines is not None and
+                 self.GetNumLines() > self.maxLines) or
+                (self.maxChars is not None and self._length > self.maxChars)):
+            length = self._lengths[self._head]
+            numRows = self._countRows(self._widths[self._head])
 
-                    # If the line is empty, we still want to add a line.
-                    # Enforce a minimum of one line here.
-                    row += max(1, numLines)
-                else:
-                    row += 1
+            self._rows.add(self._head, -numRows)
+            self._chars.add(self._head, -length)
+            self._length -= length
+            self._head += 1
 
-                continue
+            evicted += length
+            self._evictedRows += numRows
+
+        if not evicted:
+            return
 
-            for wrap in self._lines[lineNo]:
-                wrapLen = len(wrap)
+        self._store.discard(self._starts[self._head])
 
-                # Another wrapped row, no match
-                if (counted + wrapLen) < index:
-                    counted += wrapLen
-                    row += 1
-                    continue
+        # Reclaim the dropped lines once they are half of the list
+        if self._head * 2 > len(self._starts):
+            del self._starts[:self._head]
+            del self._lengths[:self._head]
+            del self._widths[:self._head]
+            self._head = 0
+            self.InvalidateCache()
 
-                col = index - counted
-                counted += col
-                break
+        self._evicted += evicted
+        self._contents = None
 
+        # Keep the selection on the same text
+        start = self._selection.GetStart() - evicted
+        end = self._selection.GetEnd() - evicted
+        self._selection.SetStart(max(0, start))
+        self._selection.SetEnd(max(0, end))
 
-            if counted >= index:
-                break
+    def CursorToIndex(self, col, row):
+        numRows = self.GetNumRows()
 
-        else:
-            raise RuntimeError('Reached end of buffer')
+        assert row > 0, 'Row "%d" below one' % row
+        assert row <= numRows, 'Row "%d" greater than total rows %d' % \
+                               (row, numRows)
+        assert col >= 0, 'Column "%d" invalid' % col
 
-        self._i2cCache[index] = col, row
+        line, wrap = self._findRow(row)
+        index = self._chars.prefix(line)
 
-        return col, row
+        # Every row before the last one of a line is full
+        return index + wrap * self.GetLimit() + \
+            min(col, len(self._getRow(line, wrap)))
+
+    def IndexToCursor(self, index):
+        assert index >= 0, 'Invalid index position "%d".' % index
+        assert index <= len(self), 'Invalid index position "%d".' % index
+
+        if not self.GetNumLines():
+            return 0, 1
+
+        # The end of the buffer is on the last line
+        line = min(self._chars.search(index), len(self._starts) - 1)
+        offset = index - self._chars.prefix(line)
+        numRows = self._countRows(self._widths[line])
+        row = self._rows.prefix(line) + 1
+
+        if not numRows:
+            return offset, row
+
+        wrap = min(offset // self.GetLimit(), numRows - 1)
+        col = min(offset - wrap * self.GetLimit(),
+                  len(self._getRow(line, wrap)))
+
+        return col, row + wrap
 
 
 class TerminalCtrl(ScrolledPanel):
@@ -423,6 +608,12 @@ class TerminalCtrl(ScrolledPanel):
 
     _scrollPos = None
     _scrollbarFollowText = True
+    _dragStart = 0
+
+    # Text queued from other threads is added at most this many times a
+    # second, so bursts cost one layout and repaint per frame
+    _frameRate = 30
+    _lastFrame = 0.0
 
     def __init__(self, parent, id=wx.ID_ANY, pos=wx.DefaultPosition,
                  size=wx.DefaultSize, style=0, name=wx.ControlNameStr):
@@ -458,6 +649,11 @@ class TerminalCtrl(ScrolledPanel):
         # This will be our text selection overlay
         self._overlay = wx.Overlay()
 
+        # Text waiting for the next frame
+        self._queued = []
+        self._queueLock = Lock()
+        self._frameTimer = wx.Timer(self)
+
         # Set up scrolling
         self.EnableScrolling(True, True)
 
@@ -465,6 +661,7 @@ class TerminalCtrl(ScrolledPanel):
         self.Bind(wx.EVT_SIZE,  self._OnSize)
         self.Bind(wx.EVT_SCROLLWIN, self._OnScroll)
         self.Bind(wx.EVT_ERASE_BACKGROUND, self._OnEraseBackground)
+        self.Bind(wx.EVT_TIMER, self._OnFrame, self._frameTimer)
 
         self.Bind(wx.EVT_LEFT_DOWN, self._OnMouseDown)
         self.Bind(wx.EVT_MOTION, self._OnMouseMove)
@@ -473,11 +670,79 @@ class TerminalCtrl(ScrolledPanel):
         self._OnSize(None)
 
     def AddChars(self, chars):
+        evicted = self._buffer.GetEvicted()
+        evictedRows = self._buffer.GetEvictedRows()
         self._buffer += chars
+        evicted = self._buffer.GetEvicted() - evicted
+        evictedRows = self._buffer.GetEvictedRows() - evictedRows
 
-        # Now we must recalculate
+        # Indexes into the buffer move down as old lines are dropped
+        if evicted:
+            self._scrollPos = max(0, self._scrollPos - evicted)
+            self._dragStart = max(0, self._dragStart - evicted)
+
+        # Now we must recalculate. Scrolling to follow the text blits what
+        # is already on screen, and exposes the rows below it
         self.InvalidateBestSize()
-        self.Refresh()
+
+        _, textHeight = self.GetTextMetrics()
+        lineHeight = textHeight + self.GetSpacing()
+
+        # Rows dropped from the top move the rest up, whatever the scroll
+        # position says
+        if evictedRows:
+            self.ScrollWindow(0, -evictedRows * lineHeight)
+
+        # Only the rows that changed are painted again
+        _, top = self.CalcScrolledPosition(
+            self.BufferToLogical(0, self._buffer.GetChangedRow()))
+        width, height = self.GetClientSize()
+
+        if top < height:
+            top = max(0, top)
+            self.RefreshRect(wx.Rect(0, top, width, height - top))
+
+    def QueueChars(self, chars):
+        """
+        Adds text from any thread. Text queued between frames is added in
+        one go on the next frame.
+        """
+        with self._queueLock:
+            self._queued.append(chars)
+
+            # A frame is already on its way
+            if len(self._queued) > 1:
+                return
+
+        wx.CallAfter(self._ScheduleFrame)
+
+    def SetFrameRate(self, frameRate):
+        self._frameRate = frameRate
+
+    def GetFrameRate(self):
+        return self._frameRate
+
+    def _ScheduleFrame(self):
+        # The control may have been destroyed since
+        if not self or self._frameTimer.IsRunning():
+            return
+
+        wait = self._lastFrame + 1 / self._frameRate - time.monotonic()
+
+        if wait > 0:
+            self._frameTimer.StartOnce(math.ceil(wait * 1000))
+        else:
+            self._OnFrame(None)
+
+    def _OnFrame(self, event):
+        with self._queueLock:
+            chars = ''.join(self._queued)
+            self._queued = []
+
+        self._lastFrame = time.monotonic()
+
+        if chars:
+            self.AddChars(chars)
 
     # As per wx.TextEntry
     def GetValue(self):
@@ -509,6 +774,16 @@ class TerminalCtrl(ScrolledPanel):
     def GetSpacing(self):
         return self._lineSpacing
 
+    def SetScrollback(self, maxLines=None, maxChars=None):
+        """
+        Limits the lines, and characters, kept. None for no limit.
+        """
+        self._buffer.SetScrollback(maxLines, maxChars)
+
+        # Now we must recalculate
+        self.InvalidateBestSize()
+        self.Refresh()
+
     def SetWrap(self, wrap=None):
         self._buffer.SetWrap(wrap)
 
@@ -560,7 +835,10 @@ class TerminalCtrl(ScrolledPanel):
             self.ShowScrollbars(True, True)
             self.EnableScrolling(True, True)
 
-        self.SetScrollbars(textWidth, textHeight + spacing, width, buflen, True)
+        # From where we are, so Scroll() can blit from there
+        viewX, viewY = self.GetViewStart()
+        self.SetScrollbars(textWidth, textHeight + spacing, width, buflen,
+                           viewX, viewY, True)
 
         # If we are to scroll with the text, update the scroll index to
         # appropriate index
@@ -636,7 +914,23 @@ class TerminalCtrl(ScrolledPanel):
 
         return math.floor(screenHeight / lineHeight)
 
-    def _Draw(self, dc):
+    def GetRowsInRect(self, rect):
+        """
+        Returns the first and last 1-based rows that intersect `rect`, in
+        client coordinates.
+        """
+        _, textHeight = self.GetTextMetrics()
+        lineHeight = textHeight + self.GetSpacing()
+
+        top = self.CalcUnscrolledPosition(rect.GetTopLeft()).y
+        bottom = self.CalcUnscrolledPosition(rect.GetBottomLeft()).y
+
+        first = math.floor(top / lineHeight) + 1
+        last = math.floor(bottom / lineHeight) + 1
+
+        return first, min(last, self._buffer.GetNumRows())
+
+    def _Draw(self, dc, rect):
         backColor = self.GetBackgroundColour()
         backBrush = wx.Brush(backColor, wx.SOLID)
         dc.SetBackground(backBrush)
@@ -646,19 +940,18 @@ class TerminalCtrl(ScrolledPanel):
         dc.SetTextForeground(foreColor)
         dc.SetFont(self.GetFont())
 
-        textWidth, textHeight = self.GetTextMetrics()
-
-        lineNo = 0
-        for line in self._buffer:
-            for wrap in line:
-                lineNo += 1
-                _, y = self.BufferToLogical(0, lineNo)
+        # Only the rows being repainted are drawn, in a single call
+        first, last = self.GetRowsInRect(rect)
+        rows = list(self._buffer.GetRows(first, last))
+        coords = [self.BufferToLogical(0, first + i)
+                  for i in range(len(rows))]
 
-                dc.DrawText(str(wrap), 0, y)
+        if rows:
+            dc.DrawTextList(rows, coords)
 
-        self._DrawSelection(dc)
+        self._DrawSelection(dc, first, last)
 
-    def _DrawSelection(self, dc):
+    def _DrawSelection(self, dc, first, last):
         selection = self._buffer.GetSelection()
         self._overlay.Reset()
 
@@ -684,7 +977,8 @@ class TerminalCtrl(ScrolledPanel):
         left = self.BufferToLogical(selStart[0], selStart[1])
         textWidth, lineHeight = self.GetTextMetrics()
 
-        for row in range(selStart[1], selEnd[1] + 1):
+        # Rows out of view are not drawn
+        for row in range(max(first, selStart[1]), min(last, selEnd[1]) + 1):
             line = self._buffer.GetLineForRow(row)
 
             lineLen = len(line)
@@ -724,7 +1018,7 @@ class TerminalCtrl(ScrolledPanel):
     def _OnPaint(self, event):
         dc = wx.BufferedPaintDC(self)
         self.DoPrepareDC(dc)
-        self._Draw(dc)
+        self._Draw(dc, self.GetUpdateRegion().GetBox())
 
     def _OnSize(self, event):
         textWidth, textHeight = self.GetTextMetrics()
@@ -738,6 +1032,9 @@ class TerminalCtrl(ScrolledPanel):
         if self.GetWrap():
             self.InvalidateBestSize()
 
+            # Every row may have been rewrapped
+            self.Refresh()
+
     def _OnScroll(self, event):
         evtType = event.GetEventType()
         currScroll = self._buffer.IndexToCursor(self._scrollPos)
@@ -802,7 +1099,7 @@ class TerminalCtrl(ScrolledPanel):
     def _OnMouseDown(self, event):
         self.CaptureMouse()
 
-        maxSel = len(str(self._buffer).rstrip())
+        maxSel = self._buffer.GetTrimmedLength()
         maxY = self.GetTextMetrics()[1] * self._buffer.GetNumRows()
 
         pos = self.CalcUnscrolledPosition(event.GetPosition())
@@ -826,7 +1123,7 @@ class TerminalCtrl(ScrolledPanel):
 
     def _OnMouseMove(self, event):
         if event.Dragging() and event.LeftIsDown():
-            maxSel = len(str(self._buffer).rstrip())
+            maxSel = self._buffer.GetTrimmedLength()
             maxY = self.GetTextMetrics()[1] * self._buffer.GetNumRows()
 
             pos = self.CalcUnscrolledPosition(event.GetPosition())
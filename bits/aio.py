@@ -0,0 +1,260 @@
+import os
+import asyncio
+from .expect import StreamMatcher
+from .reader import BufferedReader
+
+
+class SerialTransport(asyncio.Transport):
+    """
+    Non-blocking transport over the file descriptor of an open
+    `serial.Serial`. The port's settings are left as they are; only reads
+    and writes go through the event loop. POSIX only.
+    """
+    max_size = 4096
+
+    def __init__(self, loop, protocol, port):
+        super().__init__({'serial': port})
+
+        self._loop = loop
+        self._protocol = protocol
+        self._port = port
+        self._fd = port.fileno()
+        self._buffer = bytearray()
+        self._closing = False
+
+        os.set_blocking(self._fd, False)
+
+        self._loop.call_soon(self._protocol.connection_made, self)
+        self._loop.call_soon(self._loop.add_reader, self._fd, self._read_ready)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self._fd, self.max_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self._close(exc)
+            return
+
+        if data:
+            self._protocol.data_received(data)
+
+    def _write_ready(self):
+        try:
+            sent = os.write(self._fd, self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self._close(exc)
+            return
+
+        del self._buffer[:sent]
+
+        if not self._buffer:
+            self._loop.remove_writer(self._fd)
+
+    def write(self, data):
+        if self._closing or not data:
+            return
+
+        if not self._buffer:
+            try:
+                sent = os.write(self._fd, data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as exc:
+                self._close(exc)
+                return
+
+            data = data[sent:]
+
+            if not data:
+                return
+
+            self._loop.add_writer(self._fd, self._write_ready)
+
+        self._buffer += data
+
+    def get_write_buffer_size(self):
+        return len(self._buffer)
+
+    async def send_break(self, duration=0.25):
+        self._port.break_condition = True
+        await asyncio.sleep(duration)
+        self._port.break_condition = False
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        self._close(None)
+
+    def _close(self, exc):
+        if self._closing:
+            return
+
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        self._loop.call_soon(self._protocol.connection_lost, exc)
+
+
+class SerialProtocol(asyncio.Protocol):
+    """
+    Feeds received data into a `StreamMatcher` that coroutines can wait on.
+    Listeners are called with each chunk as it is received.
+    """
+    transport = None
+
+    # A `bits.pager.Pager` filtering what reaches the stream, if any
+    pager = None
+
+    def __init__(self):
+        self.stream = StreamMatcher()
+        self._received = asyncio.Event()
+        self._listeners = []
+        self._exception = None
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        for listener in self._listeners:
+            listener(data)
+
+        if self.pager is not None:
+            data = self.pager.filter(data)
+
+        self.stream.feed(data)
+        self._received.set()
+
+    def connection_lost(self, exc):
+        self._closed = True
+        self._exception = exc
+        self._received.set()
+
+    async def expect(self, pattern):
+        """
+        Waits for `pattern` and returns the consumed bytes and the match.
+        """
+        while True:
+            found = self.stream.search(pattern)
+            if found is not None:
+                return found
+
+            if self._closed:
+                raise ConnectionError('Serial port closed') \
+                    from self._exception
+
+            self._received.clear()
+            await self._received.wait()
+
+
+class _ThreadedProtocol(BufferedReader, asyncio.Protocol):
+    """
+    Buffers received data for a synchronous script running on another
+    thread. It stands in for the `SerialReader` the script would otherwise
+    start itself.
+    """
+
+    def __init__(self):
+        BufferedReader.__init__(self)
+
+    def data_received(self, data):
+        self.feed(data)
+
+    def connection_lost(self, exc):
+        self.close()
+
+
+class _ThreadedPort:
+    """
+    The write side of a serial port, as used by synchronous scripts, routed
+    through the event loop.
+    """
+
+    def __init__(self, loop, transport):
+        self._loop = loop
+        self._transport = transport
+        self._serial = transport.get_extra_info('serial')
+        self.port = self._serial.port
+
+    @property
+    def baudrate(self):
+        return self._serial.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self._serial.baudrate = value
+
+    def write(self, data):
+        self._loop.call_soon_threadsafe(self._transport.write, data)
+        return len(data)
+
+    def flush(self):
+        """
+        Waits until everything written has been sent.
+        """
+        asyncio.run_coroutine_threadsafe(drain(self._transport),
+                                         self._loop).result()
+        self._serial.flush()
+
+    def send_break(self, duration=0.25):
+        coro = self._transport.send_break(duration)
+        asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+async def drain(transport):
+    """
+    Waits until the transport has handed everything written to the port.
+    """
+    while transport.get_write_buffer_size():
+        await asyncio.sleep(0.01)
+
+
+async def open_serial(port, protocol_factory=SerialProtocol):
+    """
+    Attaches an open `serial.Serial` to the running event loop. Returns the
+    transport and protocol.
+    """
+    loop = asyncio.get_running_loop()
+    protocol = protocol_factory()
+    transport = SerialTransport(loop, protocol, port)
+
+    return transport, protocol
+
+
+async def run_sync(script, port, executor=None):
+    """
+    Runs a synchronous `Base` script against `port` from the event loop.
+
+    The script's blocking `execute` runs on `executor` (the loop's default
+    executor if None) and reads from a buffer filled by the loop, so
+    synchronous scripts can be driven alongside asynchronous ones.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await open_serial(port, _ThreadedProtocol)
+
+    script._reader = protocol
+    protocol.pager = script._pager
+    script._comms = _ThreadedPort(loop, transport)
+    script.metrics.port = port.port
+    script.startTranscript(protocol)
+
+    try:
+        await loop.run_in_executor(executor, script.execute)
+    finally:
+        script._closing = True
+        transport.close()
+        script.stopTranscript()
@@ -0,0 +1,117 @@
+import time
+
+# Rates tried when detecting the console rate, most common first
+RATES = (9600, 115200, 38400, 19200, 57600)
+
+# Bytes expected on a console at the right rate: printable ASCII and the
+# usual whitespace
+_TEXT = frozenset(range(0x20, 0x7F)) | {0x07, 0x08, 0x09, 0x0A, 0x0D, 0x1B}
+
+
+def printable(data):
+    """
+    Returns the fraction of `data` that looks like console text. Output
+    read at the wrong rate is mostly framing garbage and high-bit bytes.
+    """
+    if not data:
+        return 0.0
+
+    return sum(1 for x in data if x in _TEXT) / len(data)
+
+
+def looks_right(data, threshold=0.9):
+    return printable(data) >= threshold
+
+
+def candidates(rate, previous, rates=RATES):
+    """
+    Rates to look for a console on once it has been told to change to
+    `rate`, most likely first.
+    """
+    return tuple(dict.fromkeys((rate, previous) + tuple(rates)))
+
+
+class Sample:
+    """
+    What arrives after a rate change, to check the link by: up to `size`
+    bytes, or what arrived before the line went quiet for `quiet` seconds,
+    within `timeout` seconds.
+
+    Readers alternate between waiting up to `wait()` seconds for more and
+    passing what arrived (b'' if nothing did) to `add()`, until `wait()`
+    returns None.
+    """
+
+    def __init__(self, size=64, timeout=5, quiet=0.5):
+        self.data = bytearray()
+        self.size = size
+        self.started = time.monotonic()
+        self._deadline = self.started + timeout
+        self._quiet = quiet
+        self._done = False
+
+    def wait(self):
+        if self._done or len(self.data) >= self.size:
+            return None
+
+        left = self._deadline - time.monotonic()
+
+        if left <= 0:
+            return None
+
+        return min(left, self._quiet) if self.data else left
+
+    def add(self, data):
+        # Nothing more once something has arrived: the line went quiet
+        if not data and self.data:
+            self._done = True
+
+        self.data += data
+
+
+def detect(port, rates=RATES, size=64, dwell=0.25, timeout=None,
+           cancelled=None, read=None):
+    """
+    Cycles `port` through `rates` until what arrives at one of them looks
+    like console text, and returns that rate and the bytes read at it.
+    pyserial does not report framing errors, but they come through as NULs
+    and high-bit bytes, which count against a rate.
+
+    Each rate listens for up to `dwell` seconds and `size` bytes, so a
+    talkative console is locked onto within a few hundred bytes. Returns
+    (None, b'') on `timeout` or once `cancelled()` is true.
+
+    What arrives is read from the port, unless another reader owns it; then
+    `read(size, dwell)` is called instead, and should discard what arrived
+    at the previous rate.
+    """
+    started = time.monotonic()
+    owned = read is None
+
+    if owned:
+        previous = port.timeout
+        port.timeout = dwell
+
+        def read(size, dwell):
+            port.reset_input_buffer()
+            return port.read(size)
+
+    try:
+        while True:
+            for rate in rates:
+                if cancelled is not None and cancelled():
+                    return None, b''
+
+                if timeout is not None and \
+                        time.monotonic() - started > timeout:
+                    return None, b''
+
+                port.baudrate = rate
+                sample = read(size, dwell)
+
+                # A few bytes of garbage can look like text by chance
+                if len(sample) >= 16 and looks_right(sample):
+                    return rate, sample
+    finally:
+        if owned:
+            port.timeout = previous
@@ -0,0 +1,540 @@
+"""
+Console emulators for the dialects the device scripts target, for load
+testing without hardware.
+
+Each emulator is a coroutine driving a `Console`, served either on a pseudo
+terminal (which the scripts open like any serial port) or on a TCP socket
+(`socket://host:port` in pyserial). Breaks cannot be carried over either,
+so an "interrupt boot" window in which nothing arrives drops into the boot
+monitor when it expires, as if the break had been received. One in which
+only the wrong key arrives boots as the device would.
+"""
+
+import os
+import sys
+import time
+import serial
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .aio import run_sync
+
+CTRL_C = '\x03'
+ESC = '\x1B'
+
+
+class Console:
+    """
+    One end of an emulated console. Delays are divided by `speed`, and
+    output is paced to `baud` (8N1) if given.
+    """
+
+    def __init__(self, reader, writer, speed=1.0, baud=None):
+        self._reader = reader
+        self._writer = writer
+        self.speed = speed
+        self.baud = baud
+        self._lastCR = False
+        self._pending = None
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self.speed)
+
+    async def write(self, text):
+        data = text.encode('utf-8')
+        self._writer.write(data)
+        await self._writer.drain()
+
+        if self.baud:
+            await self.sleep(len(data) * 10 / self.baud)
+
+    async def read(self):
+        if self._pending is not None:
+            # A character `key` gave up on
+            task, self._pending = self._pending, None
+            return await task
+
+        data = await self._reader.read(1)
+
+        if not data:
+            raise EOFError()
+
+        return data.decode('utf-8', 'replace')
+
+    async def key(self, seconds, keys):
+        """
+        Waits up to `seconds` for one of `keys`, passing over any other, as
+        a boot loader waits for the key that interrupts it. Returns the key,
+        None if nothing arrived (as when a break is sent, which cannot be
+        carried over), or '' if only other keys did.
+        """
+        deadline = time.monotonic() + seconds / self.speed
+        other = None
+
+        while True:
+            left = deadline - time.monotonic()
+
+            if left <= 0:
+                return other
+
+            # Cancelling a read can lose what it had already taken from the
+            # stream, so one that times out is left for the next read
+            task = self._pending or asyncio.ensure_future(self.read())
+            self._pending = None
+            done, _ = await asyncio.wait([task], timeout=left)
+
+            if not done:
+                self._pending = task
+                return other
+
+            char = task.result()
+
+            if char in keys:
+                return char
+
+            other = ''
+
+    async def readline(self, echo=True):
+        line = ''
+
+        while True:
+            char = await self.read()
+
+            # Treat CR LF as a single line ending
+            if char == '\n' and self._lastCR:
+                self._lastCR = False
+                continue
+
+            self._lastCR = char == '\r'
+
+            if char in '\r\n':
+                if echo:
+                    await self.write('\r\n')
+
+                return line
+
+            if char == '\b':
+                line = line[:-1]
+            elif char >= ' ':
+                line += char
+            else:
+                # Late interrupt keys and other control characters
+                continue
+
+            if echo:
+                await self.write(char)
+
+    async def noise(self, lines, template='%06d: boot progress message\r\n'):
+        for i in range(lines):
+            await self.write(template % i)
+
+
+async def _confreg(console):
+    questions = [
+        'Do you wish to change the configuration? y/n  [n]:  ',
+        'enable  "diagnostic mode"? y/n  [n]:  ',
+        'enable  "use net in IP bcast address"? y/n  [n]:  ',
+        'enable  "load rom after netboot fails"? y/n  [n]:  ',
+        'enable  "use all zero broadcast"? y/n  [n]:  ',
+        'disable "break/abort has effect"? y/n  [n]:  ',
+        'enable  "ignore system config info"? y/n  [n]:  ',
+        'change console baud rate? y/n  [n]:  ',
+        'change the boot characteristics? y/n  [n]:  ',
+    ]
+
+    await console.write('\r\n    Configuration Summary\r\n'
+                        'enabled are:\r\nconsole baud: 9600\r\n'
+                        'boot: image specified by the boot system commands'
+                        '\r\n\r\n')
+
+    for question in questions:
+        await console.write(question)
+        answer = await console.readline()
+
+        if question.startswith('Do you') and answer != 'y':
+            return
+
+        if question.startswith('change console') and answer == 'y':
+            await console.write('enter rate: 0 = 9600, 1 = 4800, 2 = 1200, '
+                                '3 = 2400\r\n            4 = 19200, '
+                                '5 = 38400, 6 = 57600, 7 = 115200  [0]:  ')
+            await console.readline()
+
+    await console.write('\r\nConfiguration Summary\r\n'
+                        'do you wish to save this configuration? '
+                        'y/n  [n]:  ')
+    await console.readline()
+
+
+async def _ios_cli(console, host, erase):
+    """
+    IOS exec and configuration modes, until the console closes.
+    """
+    mode = '>'
+
+    while True:
+        await console.write('%s%s' % (host, mode))
+        command = await console.readline()
+
+        if mode == '>' and command in ('en', 'enable'):
+            mode = '#'
+        elif mode == '#' and command.startswith('conf'):
+            await console.write('Enter configuration commands, one per line.'
+                                '  End with CNTL/Z.\r\n')
+            mode = '(config)#'
+        elif mode == '(config)#' and command in ('end', 'exit'):
+            mode = '#'
+        elif mode == '#' and command in erase:
+            await console.write(erase[command])
+
+            if await console.read() in 'yY\r\n':
+                await console.write('[OK]\r\nErase of %s: complete\r\n' %
+                                    command.split()[-1])
+
+
+async def ios_switch(console, bootLines=2000):
+    """
+    Catalyst 4500/4948: ROMMON with autoboot, then IOS.
+    """
+    erase = {
+        'write erase': 'Erasing the nvram filesystem will remove all '
+                       'configuration files! Continue? [confirm]',
+        'erase cat4000_flash:': 'Erasing the cat4000_flash filesystem will '
+                                'remove all files! Continue? [confirm]',
+    }
+    env = {'PS1': 'rommon ! >', 'VS_SWITCH_NUMBER': '1', 'BAUD': '9600'}
+
+    await console.write('\r\nRom Monitor Program Version 12.2(44r)SG\r\n')
+    await console.noise(bootLines // 10)
+    await console.write('Type control-C to prevent autobooting.\r\n')
+    # Any other key goes unnoticed, and the switch boots straight into IOS
+    autoboot = await console.key(5, CTRL_C) == ''
+
+    count = 1
+    while not autoboot:
+        await console.write('\r\nrommon %d >' % count)
+        command = await console.readline()
+        count += 1
+
+        if command == 'confreg':
+            await _confreg(console)
+        elif command == 'set':
+            for key, value in env.items():
+                await console.write('%s=%s\r\n' % (key, value))
+        elif command.startswith('unset '):
+            env.pop(command.split()[1], None)
+        elif command in ('reset', 'boot'):
+            if command == 'reset':
+                await console.write('Resetting .......\r\n')
+
+            break
+
+    await console.write('Signature verified\r\nLoading image...\r\n')
+    await console.noise(bootLines)
+    await console.write('\r\nPress RETURN to get started!\r\n')
+    await console.readline(echo=False)
+
+    await _ios_cli(console, 'Switch', erase)
+
+
+async def asa(console, bootLines=2000):
+    """
+    ASA 5500: ROMMON entered with a break, then the ASA CLI.
+    """
+    await console.write('\r\nBooting system, please wait...\r\n')
+    await console.noise(bootLines // 10)
+    await console.write('Use BREAK or ESC to interrupt boot.\r\n'
+                        'Use SPACE to begin boot immediately.\r\n')
+    # A break arrives as nothing at all; SPACE, or any other key, boots
+    autoboot = await console.key(10, ESC) == ''
+
+    count = 0
+    while not autoboot:
+        await console.write('\r\nrommon #%d> ' % count)
+        command = await console.readline()
+        count += 1
+
+        if command == 'boot':
+            break
+
+    await console.noise(bootLines)
+    await console.write('Pre-configure Firewall now through interactive '
+                        'prompts [yes]? ')
+    await console.readline()
+    await console.write("\r\nType help or '?' for a list of available "
+                        "commands.\r\n")
+
+    mode = '>'
+    while True:
+        await console.write('ciscoasa%s ' % mode)
+        command = await console.readline()
+
+        if mode == '>' and command in ('en', 'enable'):
+            await console.write('Password: ')
+            await console.readline(echo=False)
+            mode = '#'
+        elif mode == '#' and command == 'write erase':
+            await console.write('Erase configuration in flash memory? '
+                                '[confirm]')
+
+            if await console.read() in 'yY\r\n':
+                await console.write('\r\n[OK]\r\n')
+        elif mode == '#' and command.startswith('conf'):
+            mode = '(config)#'
+        elif mode == '(config)#' and command in ('end', 'exit'):
+            mode = '#'
+
+
+async def uboot(console, bootLines=2000):
+    """
+    Dell Force10: U-Boot, then Dell Networking OS.
+    """
+    await console.write('\r\nU-Boot 2010.12 (Dell Networking)\r\n')
+    await console.noise(bootLines // 10)
+    await console.write('Hit Esc key to interrupt autoboot:  5')
+    autoboot = await console.key(5, ESC) == ''
+
+    while not autoboot:
+        await console.write('\r\n=> ')
+        command = await console.readline()
+
+        if command == 'saveenv':
+            await console.write('Saving Environment to Flash...\r\n')
+        elif command == 'reset':
+            break
+
+    await console.noise(bootLines)
+    await console.write('\r\nStarting Dell Networking OS\r\n')
+    await console.noise(bootLines // 10)
+
+    mode = '>'
+    while True:
+        await console.write('\r\nDell%s' % mode)
+        command = await console.readline()
+
+        if command == 'enable':
+            mode = '#'
+        elif command.startswith('restore factory-defaults'):
+            await console.write('\r\nProceed with factory settings? '
+                                'Confirm [yes/no]:')
+
+            if await console.readline() == 'yes':
+                await console.write('\r\nPower-cycling the unit...\r\n')
+
+
+# Dialect: (emulator, device script it is written for)
+DIALECTS = {
+    'ios': (ios_switch, 'cisco/sw45xx'),
+    'asa': (asa, 'cisco/asa55xx'),
+    'uboot': (uboot, 'dell/Force10'),
+}
+
+
+async def _serve(emulator, console, **kwargs):
+    try:
+        await emulator(console, **kwargs)
+    except (EOFError, ConnectionError):
+        pass
+    finally:
+        if console._pending is not None:
+            console._pending.cancel()
+
+
+class _PtyWriter:
+    """
+    Writes to the master side of a pseudo terminal. A write pipe transport
+    cannot be used there, as it takes the fd becoming readable for the
+    other end closing.
+    """
+
+    def __init__(self, loop, fd):
+        self._loop = loop
+        self._fd = fd
+        self._buffer = bytearray()
+        self._drained = None
+
+    def write(self, data):
+        self._buffer += data
+        self._flush()
+
+    def _flush(self):
+        try:
+            while self._buffer:
+                del self._buffer[:os.write(self._fd, self._buffer)]
+        except BlockingIOError:
+            if self._drained is None:
+                self._drained = self._loop.create_future()
+                self._loop.add_writer(self._fd, self._flush)
+
+            return
+        except OSError as ex:
+            self._buffer.clear()
+            error = ConnectionError(str(ex))
+        else:
+            error = None
+
+        if self._drained is not None:
+            self._loop.remove_writer(self._fd)
+
+            if error is not None:
+                self._drained.set_exception(error)
+            else:
+                self._drained.set_result(None)
+
+            self._drained = None
+        elif error is not None:
+            raise error
+
+    async def drain(self):
+        if self._drained is not None:
+            await asyncio.shield(self._drained)
+
+
+def openpty():
+    """
+    Returns the master and slave file descriptors of a new raw pseudo
+    terminal. Open the slave (by `os.ttyname(slave)`) before serving the
+    master, as opening a serial port discards anything already pending.
+    """
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+
+    return master, slave
+
+
+async def serve_pty(emulator, master, speed=1.0, baud=None, **kwargs):
+    """
+    Runs `emulator` on the master side of a pseudo terminal, returning the
+    task serving it.
+    """
+    loop = asyncio.get_running_loop()
+
+    reader = asyncio.StreamReader()
+    protocol = asyncio.StreamReaderProtocol(reader)
+    await loop.connect_read_pipe(lambda: protocol, os.fdopen(master, 'rb', 0))
+
+    console = Console(reader, _PtyWriter(loop, master), speed, baud)
+
+    return loop.create_task(_serve(emulator, console, **kwargs))
+
+
+async def serve_socket(emulator, host='127.0.0.1', port=0, speed=1.0,
+                       baud=None, **kwargs):
+    """
+    Serves `emulator` to every connection on a TCP socket, returning the
+    server. Connect with `serial.serial_for_url('socket://host:port')`.
+    """
+    async def connected(reader, writer):
+        await _serve(emulator, Console(reader, writer, speed, baud), **kwargs)
+        writer.close()
+
+    return await asyncio.start_server(connected, host, port)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(argv=None):
+    from devices import devices
+
+    parser = argparse.ArgumentParser(
+        description='Load test device scripts against emulated consoles')
+    parser.add_argument('dialect', choices=sorted(DIALECTS))
+    parser.add_argument('-n', '--sessions', type=int, default=100)
+    parser.add_argument('-s', '--speed', type=float, default=100.0,
+                        help='divide emulated delays by this factor')
+    parser.add_argument('-b', '--baud', type=int, default=None,
+                        help='pace emulated output to this rate')
+    parser.add_argument('-l', '--boot-lines', type=int, default=2000)
+    parser.add_argument('-f', '--speed-up', action='store_true',
+                        help='let scripts switch to their fastest rate')
+    args = parser.parse_args(argv)
+
+    emulator, device = DIALECTS[args.dialect]
+
+    # The emulators get their own loop, so they do not compete with the
+    # scripts' loop for time
+    emulators = asyncio.new_event_loop()
+    threading.Thread(target=emulators.run_forever, daemon=True).start()
+
+    ports = []
+    tasks = []
+
+    for _ in range(args.sessions):
+        master, slave = openpty()
+        ports.append(serial.Serial(os.ttyname(slave)))
+
+        tasks.append(asyncio.run_coroutine_threadsafe(serve_pty(
+            emulator, master, args.speed, args.baud,
+            bootLines=args.boot_lines), emulators).result())
+
+    scripts = []
+
+    async def session(port, executor):
+        script = devices.get(device.replace('/', '.'))()
+        script.transcripts = None
+        script.speedUp = args.speed_up
+        scripts.append(script)
+
+        started = time.monotonic()
+
+        try:
+            await run_sync(script, port, executor)
+        finally:
+            port.close()
+
+        return time.monotonic() - started
+
+    async def sessions():
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            return await asyncio.gather(
+                *[session(x, executor) for x in ports],
+                return_exceptions=True)
+
+    async def stop():
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    started = time.monotonic()
+    results = asyncio.run(sessions())
+    elapsed = time.monotonic() - started
+
+    asyncio.run_coroutine_threadsafe(stop(), emulators).result()
+
+    durations = [x for x in results if not isinstance(x, BaseException)]
+    failures = [x for x in results if isinstance(x, BaseException)]
+    waits = [e.elapsed for x in scripts for e in x.metrics.events
+             if e.step == 'wait']
+    consumed = sum(e.bytes for x in scripts for e in x.metrics.events
+                   if e.step == 'wait')
+
+    print('%d sessions (%d failed) in %.2fs' % (len(results), len(failures),
+                                                elapsed))
+
+    if durations:
+        print('session time: mean %.3fs, max %.3fs' % (
+            sum(durations) / len(durations), max(durations)))
+
+    if waits:
+        print('wait latency: p50 %.4fs, p95 %.4fs, p99 %.4fs' % (
+            _percentile(waits, 0.5), _percentile(waits, 0.95),
+            _percentile(waits, 0.99)))
+
+    print('throughput: %.0f bytes/s consumed by scripts' % (consumed /
+                                                           elapsed))
+
+    for failure in failures[:5]:
+        print('failed: %r' % failure)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+class ExpectTimeout(TimeoutError):
+    """
+    Raised when a pattern is not seen in time. `tail` holds the last data
+    received, to show what the device was doing instead.
+    """
+
+    def __init__(self, pattern, timeout, tail=b''):
+        self.pattern = _decode(pattern)
+        self.timeout = timeout
+        self.tail = tail.decode('utf-8', 'replace')
+
+        super().__init__('Timed out after %.1fs waiting for %r; last '
+                         'received:\n%s' % (timeout, self.pattern, self.tail))
+
+
+def _decode(expression):
+    if isinstance(expression, bytes):
+        return expression.decode('utf-8', 'replace')
+
+    return expression
+
+
+def _encode(expression):
+    if isinstance(expression, str):
+        return expression.encode('utf-8')
+
+    return expression
+
+
+class Pattern:
+    """
+    A compiled bytes expression together with the number of trailing bytes
+    that must be rescanned when new data arrives. Text expressions are
+    encoded as UTF-8.
+
+    The overlap is the longest possible match of the expression, capped at
+    `cap` for expressions with unbounded repetition.
+    """
+    cap = 1024
+
+    def __init__(self, expression, cap=None):
+        if cap is not None:
+            self.cap = cap
+
+        self.expression = re.compile(_encode(expression))
+
+        _, width = sre_parse.parse(self.expression.pattern).getwidth()
+        self.overlap = min(width, self.cap)
+
+    def __str__(self):
+        return _decode(self.expression.pattern)
+
+    def search(self, string, pos=0):
+        return self.expression.search(string, pos)
+
+
+class PatternSet(Pattern):
+    """
+    Several expressions combined into a single alternation, so that the
+    stream is scanned once for all of them.
+    """
+
+    def __init__(self, expressions, cap=None):
+        self.patterns = [re.compile(_encode(x)) for x in expressions]
+
+        # Each alternative is wrapped in a group; remember its number
+        self._groups = []
+        group = 1
+
+        for pattern in self.patterns:
+            self._groups.append(group)
+            group += pattern.groups + 1
+
+        combined = b'|'.join(b'(%s)' % x.pattern for x in self.patterns)
+        super().__init__(combined, cap)
+
+    def resolve(self, match):
+        """
+        Returns the index of the expression that produced `match`, along with
+        the match of that expression alone so its own groups are numbered as
+        written.
+        """
+        for index, group in enumerate(self._groups):
+            if match.start(group) == -1:
+                continue
+
+            own = self.patterns[index].match(match.string, match.start(group))
+            return index, own or match
+
+        raise LookupError('Match was not produced by this pattern set')
+
+
+class StreamMatcher:
+    """
+    Searches a stream of bytes incrementally.
+
+    Data is fed in as it is read. Each search only covers data that has not
+    been searched for the same pattern yet, plus the pattern overlap, and the
+    retained data is bounded to `window` bytes.
+    """
+    window = 65536
+
+    _buffer = None
+    _pattern = None
+    _scanned = 0
+
+    def __init__(self, window=None):
+        if window is not None:
+            self.window = window
+
+        self._buffer = bytearray()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        self._buffer += data
+
+        excess = len(self._buffer) - self.window
+        if excess > 0:
+            del self._buffer[:excess]
+            self._scanned = max(0, self._scanned - excess)
+
+    def search(self, pattern):
+        """
+        Returns a tuple of the consumed bytes and the match, or None.
+
+        On a match, everything up to the end of the match is consumed; the
+        remainder is kept for the next search. The match refers to the
+        consumed bytes, not to the internal buffer.
+        """
+        if pattern is not self._pattern:
+            self._pattern = pattern
+            self._scanned = 0
+
+        start = max(0, self._scanned - pattern.overlap)
+        match = pattern.search(self._buffer, start)
+
+        if match is None:
+            self._scanned = len(self._buffer)
+            return None
+
+        # Match again on an immutable copy, as the buffer is about to shrink
+        text = bytes(self._buffer[:match.end()])
+        match = pattern.search(text, match.start()) or match
+
+        del self._buffer[:len(text)]
+        self._pattern = None
+        self._scanned = 0
+
+        return text, match
+
+    def tail(self, length=256):
+        return bytes(self._buffer[-length:])
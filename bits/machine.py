@@ -0,0 +1,146 @@
+from collections import deque
+from collections import namedtuple
+from .expect import PatternSet
+
+Step = namedtuple('Step', 'state expression answer next')
+
+
+class Dialogue:
+    """
+    A conversation with a device, declared as a table of steps rather than
+    a chain of sends and waits.
+
+    Each step is (state, expression, answer, next state). In a state, the
+    expressions of all of its steps are combined into one pattern, so each
+    chunk received is scanned once whatever the number of prompts. When
+    one matches, its answer is sent followed by ENTER ('' sends just ENTER,
+    None nothing, and a callable is called with the script and the match)
+    and the dialogue moves to the next state; None ends it.
+
+    Unless `strict`, every state also watches for the prompts of the other
+    states, behind its own. A prompt that arrives out of order is answered
+    as if the dialogue had been in that state, instead of timing out.
+
+    Devices that buffer their input can be sent up to `typeahead` answers
+    ahead of their prompts, following the first step of each state. Each
+    prompt is still checked as it arrives; the first one that is not the
+    prompt expected stops the typing ahead for the rest of the
+    conversation.
+    """
+
+    def __init__(self, name, steps, start=None, strict=False, typeahead=0):
+        self.name = name
+        self.steps = [Step(*x) for x in steps]
+        self.start = start or self.steps[0].state
+        self.strict = strict
+        self.typeahead = typeahead
+
+        # One combined pattern per state, compiled up front so that every
+        # script sharing the dialogue shares them too
+        self._states = {}
+
+        for state in dict.fromkeys(x.state for x in self.steps):
+            steps = [x for x in self.steps if x.state == state]
+
+            if not strict:
+                steps += [x for x in self.steps if x.state != state]
+
+            self._states[state] = (
+                PatternSet(tuple(x.expression for x in steps)), steps)
+
+        for step in self.steps:
+            if step.next is not None and step.next not in self._states:
+                raise ValueError('%s: no steps for state "%s"' % (name,
+                                                                  step.next))
+
+    def __str__(self):
+        return self.name
+
+    def pattern(self, state):
+        return self._states[state][0]
+
+    def resolve(self, state, match):
+        """
+        Returns the step, and the match of its own expression, that produced
+        `match` in `state`.
+        """
+        pattern, steps = self._states[state]
+        index, own = pattern.resolve(match)
+
+        return steps[index], own
+
+    def predict(self, state):
+        """
+        Yields the steps expected from `state` on, as long as their answers
+        can be sent ahead.
+        """
+        while state is not None:
+            step = self._states[state][1][0]
+
+            if step.answer is None or callable(step.answer):
+                return
+
+            yield step
+            state = step.next
+
+
+class Conversation:
+    """
+    A dialogue in progress with a script. Scripts alternate between waiting
+    for `pattern()` and passing the match to `advance()` until `finished`.
+    """
+
+    def __init__(self, dialogue, script, state=None):
+        self.dialogue = dialogue
+        self.script = script
+        self.state = state or dialogue.start
+        self.typeahead = dialogue.typeahead
+
+        # Steps answered before their prompt arrived, in expected order
+        self._ahead = deque()
+
+    @property
+    def finished(self):
+        return self.state is None
+
+    def pattern(self):
+        """
+        Returns the pattern to wait for next, first typing ahead as far as
+        the dialogue allows.
+        """
+        if len(self._ahead) < self.typeahead:
+            state = self._ahead[-1].next if self._ahead else self.state
+            count = self.typeahead - len(self._ahead)
+
+            for step, _ in zip(self.dialogue.predict(state), range(count)):
+                self.script.send(step.answer)
+                self._ahead.append(step)
+
+        return self.dialogue.pattern(self.state)
+
+    def advance(self, match):
+        """
+        Answers the prompt that produced `match`, unless that was done ahead,
+        and moves to the next state. Returns what a callable answer returned
+        (which async scripts may have to await).
+        """
+        step, own = self.dialogue.resolve(self.state, match)
+        self.state = step.next
+
+        if self._ahead:
+            if step is self._ahead[0]:
+                self._ahead.popleft()
+                return None
+
+            # Unexpected prompt; whatever was typed ahead is out of our
+            # hands now, so carry on in lockstep
+            self._ahead.clear()
+            self.typeahead = 0
+
+        if callable(step.answer):
+            return step.answer(self.script, own)
+
+        if step.answer is not None:
+            self.script.send(step.answer)
+
+        return None
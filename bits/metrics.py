@@ -0,0 +1,105 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+StepEvent = namedtuple('StepEvent', 'time step pattern bytes elapsed matched')
+
+
+class Metrics:
+    """
+    Records a step event for each send, wait and break of a device script.
+    """
+
+    def __init__(self, device, port=None):
+        self.device = device
+        self.port = port
+        self.events = []
+
+    def record(self, step, elapsed, pattern='', size=0, matched=True):
+        event = StepEvent(time.time(), step, pattern, size, elapsed, matched)
+        self.events.append(event)
+
+        return event
+
+    def rows(self):
+        for event in self.events:
+            row = dict(event._asdict(), device=self.device, port=self.port)
+            row['rate'] = event.bytes / event.elapsed if event.elapsed else 0
+
+            yield row
+
+
+def write_jsonl(path, recorders):
+    """
+    Appends the events of each recorder to `path`, one JSON object a line.
+    """
+    with open(path, 'a') as fh:
+        for metrics in recorders:
+            for row in metrics.rows():
+                fh.write(json.dumps(row) + '\n')
+
+
+def _label(value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return '"%s"' % value.replace('\n', '\\n')
+
+
+def write_prometheus(path, recorders):
+    """
+    Writes totals per device, step and pattern in the Prometheus text
+    format, for the node exporter's textfile collector. The file is
+    replaced atomically.
+    """
+    totals = {}
+
+    for metrics in recorders:
+        for event in metrics.events:
+            key = (metrics.device, event.step, event.pattern)
+            total = totals.setdefault(key, [0, 0.0, 0, 0])
+            total[0] += 1
+            total[1] += event.elapsed
+            total[2] += event.bytes
+            total[3] += 0 if event.matched else 1
+
+    lines = [
+        '# HELP killswitch_step_seconds Time spent in device script steps.',
+        '# TYPE killswitch_step_seconds summary',
+    ]
+
+    for (device, step, pattern), total in sorted(totals.items()):
+        labels = 'device=%s,step=%s,pattern=%s' % (
+            _label(device), _label(step), _label(pattern))
+
+        lines.append('killswitch_step_seconds_count{%s} %d' % (labels,
+                                                               total[0]))
+        lines.append('killswitch_step_seconds_sum{%s} %s' % (labels,
+                                                             total[1]))
+
+    lines += [
+        '# HELP killswitch_step_bytes_total Bytes sent or consumed by steps.',
+        '# TYPE killswitch_step_bytes_total counter',
+    ]
+
+    for (device, step, pattern), total in sorted(totals.items()):
+        lines.append('killswitch_step_bytes_total{device=%s,step=%s,'
+                     'pattern=%s} %d' % (_label(device), _label(step),
+                                         _label(pattern), total[2]))
+
+    lines += [
+        '# HELP killswitch_step_timeouts_total Waits that timed out.',
+        '# TYPE killswitch_step_timeouts_total counter',
+    ]
+
+    for (device, step, pattern), total in sorted(totals.items()):
+        if step == 'wait':
+            lines.append('killswitch_step_timeouts_total{device=%s,'
+                         'pattern=%s} %d' % (_label(device), _label(pattern),
+                                             total[3]))
+
+    temp = path + '.tmp'
+
+    with open(temp, 'w') as fh:
+        fh.write('\n'.join(lines) + '\n')
+
+    os.replace(temp, path)
@@ -0,0 +1,150 @@
+import time
+import asyncio
+from threading import Condition
+
+
+class PacedSender:
+    """
+    Sends bulk text to a console without overrunning its input buffer.
+
+    Text goes out a line at a time, in chunks of at most `window` bytes, and
+    each chunk waits for the console to echo as many bytes before the next
+    is sent, so no more than a window is ever unread by the device. The
+    window adapts to the echo latency: it doubles while echoes come back
+    within twice the best latency seen, and halves when they slow down (the
+    device is busy, e.g. running the previous line).
+
+    Once an echo does not come at all (a password prompt, or a console that
+    does not echo), chunks are spaced by their time on the wire at `baud`,
+    or the best latency seen if longer, up to `maxDelay`, until echoes are
+    seen again.
+    """
+    window = 16
+    maxWindow = 256
+
+    # Seconds to wait for an echo before pacing without one
+    echoTimeout = 1.0
+
+    # Most seconds to leave between chunks that are not echoed
+    maxDelay = 0.25
+
+    def __init__(self, reader, write, baud=None):
+        self._reader = reader
+        self._write = write
+        self._baud = baud
+        self._cond = Condition()
+        self._received = 0
+        self._best = None
+        self._echoing = True
+
+    def _count(self, data):
+        with self._cond:
+            self._received += len(data)
+            self._cond.notify_all()
+
+    def _echo(self, expected):
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._received >= expected or self._reader.closed,
+                self.echoTimeout)
+
+    def _adapt(self, latency):
+        if self._best is None or latency < self._best:
+            self._best = latency
+
+        if latency <= 2 * self._best:
+            self.window = min(self.window * 2, self.maxWindow)
+        else:
+            self.window = max(self.window // 2, 1)
+
+    def _delay(self, count):
+        # 8N1: ten bits a character
+        wire = count * 10 / self._baud if self._baud else 0
+
+        return min(max(wire, self._best or 0), self.maxDelay)
+
+    def _chunks(self, text):
+        """
+        Yields each chunk to send, and the count of bytes received once it
+        has been echoed.
+        """
+        for line in text.splitlines(keepends=True):
+            while line and not self._reader.closed:
+                chunk, line = line[:self.window], line[self.window:]
+
+                yield chunk, self._received + len(chunk)
+
+    def send(self, text):
+        """
+        Blocks until all of `text` has been sent.
+        """
+        self._reader.subscribe(self._count)
+
+        try:
+            for chunk, expected in self._chunks(text):
+                started = time.monotonic()
+                self._write(chunk)
+
+                if not self._echoing:
+                    time.sleep(self._delay(len(chunk)))
+
+                    # The console may have started echoing again
+                    with self._cond:
+                        self._echoing = self._received >= expected
+                elif self._echo(expected):
+                    self._adapt(time.monotonic() - started)
+                else:
+                    self._echoing = False
+        finally:
+            self._reader.unsubscribe(self._count)
+
+
+class AsyncPacedSender(PacedSender):
+    """
+    A `PacedSender` for coroutines, pacing by what a `SerialProtocol`
+    receives without blocking its event loop.
+    """
+
+    def __init__(self, protocol, write, baud=None):
+        super().__init__(protocol, write, baud)
+        self._changed = asyncio.Event()
+
+    def _count(self, data):
+        self._received += len(data)
+        self._changed.set()
+
+    async def _echo(self, expected):
+        deadline = time.monotonic() + self.echoTimeout
+
+        while self._received < expected and not self._reader.closed:
+            left = deadline - time.monotonic()
+
+            if left <= 0:
+                return False
+
+            self._changed.clear()
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), left)
+            except asyncio.TimeoutError:
+                pass
+
+        return True
+
+    async def send(self, text):
+        self._reader.subscribe(self._count)
+
+        try:
+            for chunk, expected in self._chunks(text):
+                started = time.monotonic()
+                self._write(chunk)
+
+                if not self._echoing:
+                    await asyncio.sleep(self._delay(len(chunk)))
+                    self._echoing = self._received >= expected
+                elif await self._echo(expected):
+                    self._adapt(time.monotonic() - started)
+                else:
+                    self._echoing = False
+        finally:
+            self._reader.unsubscribe(self._count)
@@ -0,0 +1,98 @@
+import re
+from .expect import _encode
+
+# What consoles print to erase a pager prompt once it has been answered,
+# and pad it with
+_ERASE = re.compile(b'[ \x08]*')
+
+
+class Pager:
+    """
+    Answers pager prompts ("--More--") as soon as they are received, and
+    removes them, and the backspaces that erase them, from the data.
+
+    `pagers` is a sequence of (prompt, answer) pairs of literal text. A
+    chunk that ends in what could be the start of a prompt is held back
+    until the next one, so prompts should not start with whitespace. The
+    spaces consoles pad prompts with (" --More-- ") are removed with them,
+    as is everything up to the first byte after a prompt that is neither a
+    space nor a backspace, however the data is split into chunks.
+    """
+
+    def __init__(self, pagers, write):
+        self._answers = {_encode(x): y for x, y in pagers}
+        self._expression = re.compile(b' *(%s)' % b'|'.join(
+            re.escape(x) for x in self._answers))
+        self._write = write
+        self._held = b''
+        self._erase = False
+
+        # Whether what was last passed on ended a line
+        self._lineStart = True
+
+        # Number of pages answered
+        self.pages = 0
+
+    def _partial(self, data):
+        """
+        Length of the longest end of `data` that starts a prompt.
+        """
+        longest = 0
+
+        for prompt in self._answers:
+            for length in range(min(len(prompt) - 1, len(data)), longest, -1):
+                if data.endswith(prompt[:length]):
+                    longest = length
+                    break
+
+        return longest
+
+    def filter(self, data):
+        data = self._held + data
+        self._held = b''
+
+        kept = []
+        start = 0
+
+        while True:
+            # Until the first byte after a prompt that does not erase it
+            if self._erase:
+                start = _ERASE.match(data, start).end()
+
+                if start == len(data):
+                    break
+
+                self._erase = False
+
+            match = self._expression.search(data, start)
+
+            if match is None:
+                break
+
+            kept.append(data[start:match.start()])
+            start = match.end()
+
+            self._write(self._answers[match.group(1)])
+            self.pages += 1
+            self._erase = True
+
+        rest = data[start:]
+        held = self._partial(rest)
+
+        # Spaces that may pad a prompt still to come: before the start of
+        # one, or at the start of a line
+        body = rest[:len(rest) - held]
+        text = body.rstrip(b' ')
+        kept.append(text)
+        kept = b''.join(kept)
+
+        if kept:
+            self._lineStart = kept[-1:] in (b'\r', b'\n')
+
+        if held or self._lineStart:
+            self._held = rest[len(text):]
+        elif len(body) > len(text):
+            kept += body[len(text):]
+            self._lineStart = False
+
+        return kept
@@ -8,12 +8,16 @@ class Prompt:
     _comms = None
     _devs = None
 
+    # Auto detects the rate from what the device sends. Output before the
+    # rate locks can be lost, autoboot prompts included, so it is last
+    # rather than the default
     _bauds = [
         '9600',
         # '19200',
         '38400',
         # '57600',
-        '115200'
+        '115200',
+        'Auto'
     ]
 
     settings = {
@@ -60,7 +64,7 @@ class Prompt:
         comms.SetSelection(0)
         bauds.SetSelection(0)
         self.settings['comms'] = self._comms[0]
-        self.settings['baud'] = self._bauds[0]
+        self.settings['baud'] = self._baud(self._bauds[0])
 
         tree = _TreeWidget(panel)
         tree.setData(self._devs)
@@ -115,7 +119,12 @@ class Prompt:
         self.settings['comms'] = event.GetString()
 
     def onBauds(self, event):
-        self.settings['baud'] = int(event.GetString())
+        self.settings['baud'] = self._baud(event.GetString())
+
+    @staticmethod
+    def _baud(choice):
+        # None for auto detection
+        return None if choice == 'Auto' else int(choice)
 
     def onTree(self, event, tree):
         item = tree.GetSelection()
@@ -0,0 +1,169 @@
+import logging
+from threading import Condition
+from threading import Thread
+from serial.serialutil import SerialException
+from . import baud
+
+
+class _RingBuffer:
+    """
+    Fixed size byte buffer. When full, the oldest bytes are overwritten.
+    """
+    _data = None
+    _start = 0
+    _length = 0
+
+    def __init__(self, size):
+        self._data = bytearray(size)
+
+    def __len__(self):
+        return self._length
+
+    def write(self, data):
+        """
+        Appends `data`, returning the number of unread bytes overwritten.
+        """
+        size = len(self._data)
+        total = len(data)
+        data = memoryview(data)[-size:]
+        count = len(data)
+
+        end = (self._start + self._length) % size
+        first = min(count, size - end)
+        self._data[end:end + first] = data[:first]
+        self._data[:count - first] = data[first:]
+
+        dropped = max(0, self._length + count - size)
+        self._length = min(size, self._length + count)
+        self._start = (self._start + dropped) % size
+
+        return dropped + total - count
+
+    def read(self, count):
+        size = len(self._data)
+        count = min(count, self._length)
+
+        first = min(count, size - self._start)
+        data = bytes(self._data[self._start:self._start + first]) + \
+            bytes(self._data[:count - first])
+
+        self._start = (self._start + count) % size
+        self._length -= count
+
+        return data
+
+
+class BufferedReader:
+    """
+    Ring buffer of received data that threads can block on.
+
+    Data is pushed in with `feed`, and any thread blocked in `read` is woken
+    as soon as it arrives. Listeners are called with each chunk as it is fed.
+    """
+    size = 65536
+
+    # A `bits.pager.Pager` filtering what is buffered, if any. It answers
+    # prompts as they are fed, whether or not anyone is reading.
+    pager = None
+
+    def __init__(self, size=None):
+        if size is not None:
+            self.size = size
+
+        self._ring = _RingBuffer(self.size)
+        self._cond = Condition()
+        self._listeners = []
+        self._closing = False
+
+        # Number of bytes lost because nobody was reading
+        self.overruns = 0
+
+    @property
+    def closed(self):
+        return self._closing
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def feed(self, data):
+        for listener in self._listeners:
+            listener(data)
+
+        if self.pager is not None:
+            data = self.pager.filter(data)
+
+        with self._cond:
+            self.overruns += self._ring.write(data)
+            self._cond.notify_all()
+
+    def read(self, size=1024, timeout=None):
+        """
+        Blocks until data is available, the timeout expires or the reader is
+        closed. Returns at most `size` bytes, or b'' if none arrived.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._ring or self._closing, timeout)
+
+            return self._ring.read(size)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+
+
+class SerialReader(BufferedReader, Thread):
+    """
+    Reads from a serial port on a dedicated thread.
+
+    The port must be opened without a timeout, so that the thread blocks
+    until data arrives. Listeners are called from the reader thread.
+
+    Given candidate `rates`, the console rate is detected first (see
+    `baud.detect`) and the port left at it.
+    """
+
+    def __init__(self, port, size=None, rates=None):
+        BufferedReader.__init__(self, size)
+        Thread.__init__(self, daemon=True)
+
+        self._port = port
+        self._rates = rates
+
+    def run(self):
+        port = self._port
+
+        if self._rates:
+            # Nothing is read until the console rate has been found
+            try:
+                rate, sample = baud.detect(port, self._rates,
+                                           cancelled=lambda: self._closing)
+            except SerialException:
+                rate = None
+                self._closing = True
+
+            if rate is not None:
+                logging.getLogger(__name__).info(
+                    '%s: detected %d baud', port.port, rate)
+                self.feed(sample)
+
+        while not self._closing:
+            try:
+                data = port.read(max(1, port.in_waiting))
+            except SerialException:
+                break
+
+            if data:
+                self.feed(data)
+
+        BufferedReader.close(self)
+
+    def close(self):
+        BufferedReader.close(self)
+
+        if self.is_alive():
+            self._port.cancel_read()
+            self.join()
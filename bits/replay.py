@@ -0,0 +1,238 @@
+import sys
+import gzip
+import json
+import time
+import argparse
+from threading import Condition
+from .reader import SerialReader
+
+
+def load(path):
+    """
+    Reads an asciicast transcript, compressed or not, as a list of
+    (seconds, code, bytes) events.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    events = []
+
+    with opener(path, 'rt', encoding='utf-8') as fh:
+        header = json.loads(fh.readline())
+
+        if header.get('version') != 2:
+            raise ValueError('%s is not an asciicast v2 transcript' % path)
+
+        for line in fh:
+            delay, code, text = json.loads(line)
+            data = text.encode('utf-8', 'surrogateescape')
+            events.append((delay, code, data))
+
+    return events
+
+
+class ReplaySerial:
+    """
+    Stands in for `serial.Serial`, replaying the output of a recorded
+    session.
+
+    Output recorded after something was sent to the device is held back
+    until the script has written as many bytes, and sent as many breaks,
+    as the recording had by then. Recorded delays are divided by `speed`;
+    a speed of None delivers output as soon as it is allowed.
+    """
+    timeout = None
+    baudrate = 9600
+    break_condition = False
+
+    def __init__(self, events, speed=None, port='replay'):
+        if isinstance(events, str):
+            port = events
+            events = load(events)
+
+        self.port = port
+        self.speed = speed
+
+        self._events = events
+        self._index = 0
+        self._pending = bytearray()
+        self._cond = Condition()
+        self._cancelled = False
+        self._closed = False
+
+        # What the script has sent so far
+        self.written = 0
+        self.breaks = 0
+
+        # What the recording had sent before each event
+        self._needed = []
+        written = breaks = 0
+
+        for _, code, data in events:
+            self._needed.append((written, breaks))
+
+            if code == 'i':
+                written += len(data)
+            elif code == 'm' and data == b'break':
+                breaks += 1
+
+        self._needed.append((written, breaks))
+
+        self._lastDelay = 0.0
+        self._lastTime = time.monotonic()
+
+    @property
+    def in_waiting(self):
+        return len(self._pending)
+
+    @property
+    def is_open(self):
+        return not self._closed
+
+    def _allowed(self):
+        written, breaks = self._needed[self._index]
+        return self.written >= written and self.breaks >= breaks
+
+    def _advance(self, deadline):
+        """
+        Moves through the recording until output is pending. Returns False
+        if the read has to give up first.
+        """
+        while not self._pending:
+            if self._closed:
+                return False
+
+            # A cancel is consumed by the read it cancels, even if it came
+            # before the read started, as with pyserial
+            if self._cancelled:
+                self._cancelled = False
+                return False
+
+            now = time.monotonic()
+            wait = None if deadline is None else deadline - now
+
+            if wait is not None and wait <= 0:
+                return False
+
+            if self._index >= len(self._events) or not self._allowed():
+                # End of the recording, or waiting on the script
+                self._cond.wait(wait)
+                continue
+
+            delay, code, data = self._events[self._index]
+
+            if self.speed:
+                due = self._lastTime + (delay - self._lastDelay) / self.speed
+
+                if due > now:
+                    self._cond.wait(due - now if wait is None
+                                    else min(wait, due - now))
+                    continue
+
+            self._index += 1
+            self._lastDelay = delay
+            self._lastTime = time.monotonic()
+
+            if code == 'o':
+                self._pending += data
+
+        return True
+
+    def read(self, size=1):
+        with self._cond:
+            deadline = None
+
+            if self.timeout is not None:
+                deadline = time.monotonic() + self.timeout
+
+            if not self._advance(deadline):
+                return b''
+
+            data = bytes(self._pending[:size])
+            del self._pending[:size]
+
+            return data
+
+    def write(self, data):
+        with self._cond:
+            self.written += len(data)
+            self._cond.notify_all()
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def send_break(self, duration=0.25):
+        with self._cond:
+            self.breaks += 1
+            self._cond.notify_all()
+
+    def reset_input_buffer(self):
+        with self._cond:
+            del self._pending[:]
+
+    def cancel_read(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def finished(self):
+        return self._index >= len(self._events) and not self._pending
+
+
+def run(device, port):
+    """
+    Runs a synchronous device script against a fake port, without a window
+    or transcript. Returns the script, so its metrics can be inspected.
+    """
+    device.transcripts = None
+    device.setCommsPort(port)
+    device._reader = SerialReader(port)
+    device._reader.pager = device._pager
+    device._reader.start()
+
+    try:
+        device.execute()
+    finally:
+        device._closing = True
+        device._reader.close()
+
+    return device
+
+
+def main(argv=None):
+    from devices import devices
+
+    parser = argparse.ArgumentParser(
+        description='Run a device script against a recorded transcript')
+    parser.add_argument('transcript')
+    parser.add_argument('device', help='for example cisco/sw45xx')
+    parser.add_argument('-s', '--speed', type=float, default=None,
+                        help='replay at this multiple of the recorded pace '
+                             '(default: as fast as possible)')
+    args = parser.parse_args(argv)
+
+    device = devices.get(args.device.replace('/', '.'))()
+    port = ReplaySerial(args.transcript, args.speed)
+
+    started = time.monotonic()
+    run(device, port)
+    elapsed = time.monotonic() - started
+
+    for event in device.metrics.events:
+        print('%-6s %8.3fs %8d  %s' % (event.step, event.elapsed, event.bytes,
+                                       event.pattern))
+
+    print('Completed in %.3fs%s' % (
+        elapsed, '' if port.finished else '; recording not fully replayed'))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
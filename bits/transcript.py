@@ -0,0 +1,106 @@
+import os
+import sys
+import gzip
+import json
+import time
+import codecs
+from queue import Empty
+from queue import SimpleQueue
+from threading import Thread
+
+
+def data_directory():
+    """
+    Where KillSwitch keeps what it records for the current user.
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or \
+            os.path.expanduser('~\\AppData\\Local')
+        return os.path.join(base, 'KillSwitch')
+
+    if sys.platform == 'darwin':
+        return os.path.expanduser('~/Library/Application Support/KillSwitch')
+
+    base = os.environ.get('XDG_DATA_HOME') or \
+        os.path.expanduser('~/.local/share')
+    return os.path.join(base, 'killswitch')
+
+
+# Default directory for transcripts, whatever the working directory
+DIRECTORY = os.path.join(data_directory(), 'transcripts')
+
+
+class TranscriptRecorder(Thread):
+    """
+    Records a console session as a gzip-compressed asciicast (v2) file.
+
+    Events are timestamped with the monotonic clock when they are queued,
+    and encoding, compression and disk writes happen on this thread, so the
+    serial path only pays for a queue put. Output is "o", data written to
+    the device is "i" and breaks are "m" markers. Bytes that are not valid
+    UTF-8 are kept as surrogate escapes, so the raw stream can be recovered
+    with `data.encode('utf-8', 'surrogateescape')`.
+    """
+    flushInterval = 1.0
+
+    def __init__(self, path, title=None, width=80, height=24):
+        super().__init__(daemon=True)
+
+        # Opened here, so that an unwritable path fails the caller
+        self.path = path
+        self._fh = gzip.open(path, 'wt', encoding='utf-8')
+        self._queue = SimpleQueue()
+        self._epoch = time.monotonic()
+        self._header = {
+            'version': 2,
+            'width': width,
+            'height': height,
+            'timestamp': int(time.time()),
+        }
+
+        if title is not None:
+            self._header['title'] = title
+
+    def _put(self, code, data):
+        self._queue.put((time.monotonic() - self._epoch, code, data))
+
+    def output(self, data):
+        self._put('o', data)
+
+    def input(self, data):
+        self._put('i', data)
+
+    def marker(self, label):
+        self._put('m', label.encode('utf-8'))
+
+    def run(self):
+        decoders = {}
+
+        with self._fh as fh:
+            fh.write(json.dumps(self._header) + '\n')
+
+            while True:
+                try:
+                    event = self._queue.get(timeout=self.flushInterval)
+                except Empty:
+                    # Keep what has been recorded readable if we crash
+                    fh.flush()
+                    continue
+
+                if event is None:
+                    break
+
+                delay, code, data = event
+
+                if code not in decoders:
+                    decoders[code] = codecs.getincrementaldecoder('utf-8')(
+                        'surrogateescape')
+
+                text = decoders[code].decode(data)
+
+                if text:
+                    fh.write(json.dumps([round(delay, 6), code, text]) + '\n')
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
@@ -0,0 +1,203 @@
+import re
+import time
+import asyncio
+import inspect
+from bits.aio import drain
+from bits.aio import open_serial
+from bits.baud import Sample
+from bits.baud import candidates
+from bits.baud import looks_right
+from bits.expect import ExpectTimeout
+from bits.machine import Conversation
+from bits.paced import AsyncPacedSender
+from .Base import Base
+
+
+class AsyncBase(Base):
+    """
+    Base for device scripts written as coroutines.
+
+    The script API mirrors `Base`, except that `execute`, `wait`, `ewait`,
+    `expect`, `send_break`, `send_paced`, `change_baud` and `converse` are
+    awaited. Scripts run without a window, so
+    that a single event loop can drive many ports.
+    """
+    _transport = None
+    _protocol = None
+
+    def run(self):
+        asyncio.run(self.start(self._comms))
+
+    async def start(self, port):
+        self._comms = port
+        self.metrics.port = port.port
+        self._transport, self._protocol = await open_serial(port)
+        self._protocol.pager = self._pager
+        self.startTranscript(self._protocol)
+
+        try:
+            await self.execute()
+        finally:
+            self._transport.close()
+            self.stopTranscript()
+
+    async def execute(self):
+        raise NotImplementedError()
+
+    # Serial communications
+    async def send_break(self):
+        if self._transcript is not None:
+            self._transcript.marker('break')
+
+        started = time.monotonic()
+        await self._transport.send_break(0.4)
+        self.metrics.record('break', time.monotonic() - started)
+
+    def send_raw(self, message):
+        message = message.encode('utf-8')
+
+        if self._transcript is not None:
+            self._transcript.input(message)
+
+        self._transport.write(message)
+        self.metrics.record('send', 0.0, size=len(message))
+
+        return len(message)
+
+    async def change_baud(self, baud, probe=None, timeout=5,
+                          committed=False):
+        port = self._transport.get_extra_info('serial')
+        previous = port.baudrate
+
+        await drain(self._transport)
+        port.flush()
+        port.baudrate = baud
+
+        if probe is not None:
+            self.send_raw(probe)
+
+        sample = await self._sample(timeout)
+
+        matched = looks_right(sample.data)
+        self.metrics.record('baud', time.monotonic() - sample.started,
+                            str(baud), len(sample.data), matched)
+
+        if matched:
+            return True
+
+        if committed:
+            return await self._redetect(baud, previous, timeout) == baud
+
+        port.baudrate = previous
+
+        if probe is not None:
+            self.send_raw(probe)
+
+        return False
+
+    async def _sample(self, timeout, size=64):
+        sample = Sample(size, timeout)
+        received = asyncio.Event()
+
+        def listener(data):
+            sample.add(data)
+            received.set()
+
+        self._protocol.subscribe(listener)
+
+        try:
+            while True:
+                left = sample.wait()
+
+                if left is None:
+                    return sample
+
+                received.clear()
+
+                try:
+                    await asyncio.wait_for(received.wait(), left)
+                except asyncio.TimeoutError:
+                    sample.add(b'')
+        finally:
+            self._protocol.unsubscribe(listener)
+
+    async def _redetect(self, rate, previous, timeout):
+        # As Base._redetect; baud.detect blocks, so the rates are cycled here
+        port = self._transport.get_extra_info('serial')
+        started = time.monotonic()
+
+        while time.monotonic() - started < timeout:
+            for candidate in candidates(rate, previous):
+                port.baudrate = candidate
+                sample = await self._sample(0.25)
+
+                # A few bytes of garbage can look like text by chance
+                if len(sample.data) >= 16 and looks_right(sample.data):
+                    self.metrics.record('baud', time.monotonic() - started,
+                                        str(candidate), len(sample.data),
+                                        True)
+                    return candidate
+
+        port.baudrate = rate
+        self.metrics.record('baud', time.monotonic() - started, str(None), 0,
+                            False)
+
+        return None
+
+    async def send_paced(self, text):
+        port = self._transport.get_extra_info('serial')
+        sender = AsyncPacedSender(self._protocol, self.send_raw, port.baudrate)
+
+        await sender.send(text)
+
+    async def wait(self, message, timeout=None):
+        pattern = self._compile(re.escape(message))
+        text, _ = await self._expect(pattern, timeout)
+        return text.decode('utf-8', 'replace')
+
+    async def ewait(self, expression, timeout=None):
+        text, _ = await self._expect(self._compile(expression), timeout)
+        return text.decode('utf-8', 'replace')
+
+    async def expect(self, patterns, literal=False, timeout=None):
+        if literal:
+            patterns = [re.escape(x) for x in patterns]
+
+        patterns = self._compile(tuple(patterns))
+        text, match = await self._expect(patterns, timeout)
+        index, match = patterns.resolve(match)
+
+        return index, match, text.decode('utf-8', 'replace')
+
+    async def converse(self, dialogue, state=None, timeout=None):
+        conversation = Conversation(dialogue, self, state)
+        received = []
+
+        while not conversation.finished:
+            text, match = await self._expect(conversation.pattern(), timeout)
+            received.append(text)
+            result = conversation.advance(match)
+
+            if inspect.isawaitable(result):
+                await result
+
+        return b''.join(received).decode('utf-8', 'replace')
+
+    async def _expect(self, pattern, timeout=None):
+        if self._closing:
+            raise SystemExit()
+
+        timeout = self._timeout(timeout)
+        started = time.monotonic()
+
+        try:
+            found = await asyncio.wait_for(self._protocol.expect(pattern),
+                                           timeout)
+        except asyncio.TimeoutError:
+            self._record(pattern, started, None)
+            raise ExpectTimeout(str(pattern), timeout,
+                                self._protocol.stream.tail()) from None
+
+        self._record(pattern, started, found[0])
+
+        return found
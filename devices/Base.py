@@ -1,25 +1,27 @@
+import os
 import wx
 import re
+import codecs
 import time
+import logging
 from threading import Lock
 from threading import Thread
 from bits.images import icon
+from bits import baud
+from bits.baud import looks_right
+from bits.expect import ExpectTimeout
+from bits.expect import Pattern
+from bits.expect import PatternSet
+from bits.expect import StreamMatcher
+from bits.machine import Conversation
+from bits.metrics import Metrics
+from bits.paced import PacedSender
+from bits.pager import Pager
+from bits.reader import SerialReader
+from bits import transcript
+from bits.transcript import TranscriptRecorder
 from bits.Terminal import TerminalCtrl
 
-EVT_SERIAL_DATA = wx.NewId()
-
-
-def EVT_SERIAL(win, func):
-    win.Connect(-1, -1, EVT_SERIAL_DATA, func)
-
-
-class SerialEvent(wx.PyEvent):
-    def __init__(self, data):
-        wx.PyEvent.__init__(self)
-        self.SetEventType(EVT_SERIAL_DATA)
-        self.data = data
-
-
 class _HotkeyDialog(wx.Dialog):
     def __init__(self, parent, id=wx.ID_ANY, title="Program Shortcuts",
                  pos=wx.DefaultPosition, size=wx.DefaultSize,
@@ -54,14 +56,44 @@ class _HotkeyDialog(wx.Dialog):
 class Base:
     _app = None
     _comms = None
+    _reader = None
+    _decoder = None
     _wxObj = None
     _tLock = None
+    _pasteLock = None
     _thread = None
     _terminal = None
-    _lastbuffer = ''
+    _stream = None
+    _pager = None
+    _started = None
+    _transcript = None
+
+    # Scripts run without a window (e.g. from an event loop) have no frame
+    frame = None
 
     _closing = False
 
+    # Seconds to wait for each pattern, and for the script as a whole from
+    # its first wait. None waits forever.
+    timeout = 600
+    deadline = 3600
+
+    # Directory session transcripts are recorded to. None disables them.
+    transcripts = transcript.DIRECTORY
+
+    # Fastest console rate the model supports, and whether to switch to it
+    # once the script is able to
+    fastBaud = None
+    speedUp = False
+
+    # Detect the console rate from what the device sends, rather than
+    # trusting the rate the port was opened at
+    autoBaud = False
+
+    # Pager prompts answered as they arrive, as (prompt, answer) pairs; they
+    # are removed from the text waits return
+    pagers = ()
+
     CTRL_C = '\x03'
     ESC = '\x1B'
     ENTER = '\n'
@@ -70,6 +102,16 @@ class Base:
     map = {}
 
     def __init__(self):
+        self._stream = StreamMatcher()
+        self._pasteLock = Lock()
+
+        if self.pagers:
+            self._pager = Pager(self.pagers, self.send_raw)
+
+        # A step event for every send, wait and break
+        self.metrics = Metrics(self.__class__.__name__)
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
         keys = (
             "BACK", "TAB", "RETURN", "ESCAPE", "SPACE", "DELETE", "START",
             "LBUTTON", "RBUTTON", "CANCEL", "MBUTTON", "CLEAR", "PAUSE",
@@ -104,11 +146,47 @@ class Base:
 
     def setCommsPort(self, communications):
         self._comms = communications
+        self.metrics.port = communications.port
 
     def run(self):
+        rates = baud.RATES if self.autoBaud else None
+        self._reader = SerialReader(self._comms, rates=rates)
+        self._reader.pager = self._pager
+        self.startTranscript(self._reader)
         self._run_thread()
         self.setup()
 
+    def startTranscript(self, source):
+        """
+        Records everything received from `source` and everything sent, until
+        `stopTranscript` is called.
+        """
+        if self.transcripts is None:
+            return
+
+        port = os.path.basename(self._comms.port)
+        name = '%s-%s-%s.cast.gz' % (time.strftime('%Y%m%d-%H%M%S'), port,
+                                     self.__class__.__name__)
+        title = '%s: %s' % (self._comms.port, self.__class__.__name__)
+
+        # A session is worth more than its transcript
+        try:
+            os.makedirs(self.transcripts, exist_ok=True)
+            self._transcript = TranscriptRecorder(
+                os.path.join(self.transcripts, name), title)
+        except OSError as ex:
+            logging.getLogger(self.__class__.__name__).warning(
+                'Not recording a transcript: %s', ex)
+            return
+
+        self._transcript.start()
+
+        source.subscribe(self._transcript.output)
+
+    def stopTranscript(self):
+        if self._transcript is not None:
+            self._transcript.close()
+
     def execute(self):
         raise NotImplementedError()
 
@@ -119,7 +197,13 @@ class Base:
 
     def _do_execute(self):
         self._tLock.acquire()
-        self.execute()
+
+        try:
+            self.execute()
+        except ExpectTimeout as ex:
+            self.prompt(str(ex), caption="KillSwitch Timeout")
+            return
+
         self.prompt("All done!")
 
     def setup(self):
@@ -133,8 +217,9 @@ class Base:
         self.InitAccelerators()
         self.InitBindings()
 
-        # Register for events from Serial Communications thread
-        EVT_SERIAL(self.frame, self.onSerialData)
+        # Register for data from Serial Communications thread
+        self._reader.subscribe(self.onSerialRead)
+        self._reader.start()
 
         self._tLock.release()
         app.MainLoop()
@@ -204,12 +289,19 @@ class Base:
 
     def onClose(self, event):
         self._closing = True
+        self._reader.close()
         self._thread.join()
+        self.stopTranscript()
         self.frame.Destroy()
         wx.App.Get().ExitMainLoop()
 
-    def onSerialData(self, event):
-        self.terminal.AddChars(event.data)
+    def onSerialRead(self, data):
+        # Called from the reader thread. The decoder keeps multi-byte
+        # sequences split across reads, and replaces line noise.
+        text = self._decoder.decode(data)
+
+        if text:
+            self.terminal.QueueChars(text)
 
     def onChar(self, event):
         code = event.GetUnicodeKey()
@@ -244,9 +336,16 @@ class Base:
         if not success:
             return
 
-        self.send_raw(text.GetText())
+        # Off the GUI thread, as it waits for the device to keep up
+        Thread(target=self.send_paced, args=(text.GetText(),),
+               daemon=True).start()
 
     def prompt(self, message, caption="KillSwitch Notification"):
+        if self.frame is None:
+            logger = logging.getLogger(self.__class__.__name__)
+            logger.info('%s: %s', self._comms.port, message)
+            return
+
         style = wx.OK | wx.OK_DEFAULT | wx.STAY_ON_TOP | wx.ICON_INFORMATION
 
         dialog = wx.MessageDialog(None, message, caption, style)
@@ -255,63 +354,235 @@ class Base:
 
     # Serial communications
     def send_break(self):
-        return self._comms.send_break(0.4)
+        if self._transcript is not None:
+            self._transcript.marker('break')
+
+        started = time.monotonic()
+        result = self._comms.send_break(0.4)
+        self.metrics.record('break', time.monotonic() - started)
+
+        return result
 
     def send(self, message):
         return self.send_raw(message + self.ENTER)
 
     def send_raw(self, message):
         message = message.encode('utf-8')
-        return self._comms.write(message)
 
-    def wait(self, message):
-        buffer = ''
-        bufflen = 0
+        if self._transcript is not None:
+            self._transcript.input(message)
 
-        while True:
-            if self._closing:
-                raise SystemExit()
+        started = time.monotonic()
+        result = self._comms.write(message)
+        self.metrics.record('send', time.monotonic() - started,
+                            size=len(message))
+
+        return result
+
+    def escalating(self):
+        """
+        True if the console should be switched to `fastBaud`.
+        """
+        return (self.speedUp and self.fastBaud is not None and
+                self.fastBaud != self._comms.baudrate)
+
+    def change_baud(self, baud, probe=None, timeout=5, committed=False):
+        """
+        Follows the device to `baud`, once it has been told to change rate.
+        The link is checked on what arrives next (in answer to `probe`, if
+        given). If that does not look like text, False is returned and the
+        previous rate restored; unless the device has `committed` to the new
+        rate (ROMMON once confreg is saved), when there is no going back and
+        its rate is detected from what it sends instead. Nothing received at
+        the right rate is lost to waits.
+        """
+        previous = self._comms.baudrate
+
+        # Whatever is buffered arrived at the old rate
+        self._comms.flush()
+        self._stream.feed(self._reader.read(1 << 20, 0))
+
+        self._comms.baudrate = baud
 
-            data = self._comms.read(1024).decode()
-            datalen = len(data)
+        if probe is not None:
+            self.send_raw(probe)
 
-            if datalen > 0:
-                buffer += data
-                bufflen += datalen
+        sample = self._sample(timeout)
+        self._stream.feed(sample.data)
 
-                # update buffer
-                wx.PostEvent(self.frame, SerialEvent(data))
+        matched = looks_right(sample.data)
+        self.metrics.record('baud', time.monotonic() - sample.started,
+                            str(baud), len(sample.data), matched)
 
-                pos = (self._lastbuffer + buffer).rfind(message)
-                if (pos is not -1):
-                    self._lastbuffer = buffer[pos+len(message):]
-                    break
+        if matched:
+            return True
 
-        return buffer
+        if committed:
+            return self._redetect(baud, previous, timeout) == baud
 
-    def ewait(self, expression):
-        buffer = ''
-        bufflen = 0
+        self._comms.baudrate = previous
 
-        expr = re.compile(expression)
+        if probe is not None:
+            self.send_raw(probe)
+
+        return False
+
+    def _sample(self, timeout, size=64):
+        sample = baud.Sample(size, timeout)
 
         while True:
-            if self._closing:
+            left = sample.wait()
+
+            if left is None:
+                return sample
+
+            data = self._reader.read(sample.size - len(sample.data), left)
+
+            if len(data) == 0 and self._reader.closed:
                 raise SystemExit()
 
-            data = self._comms.read(1024).decode()
-            datalen = len(data)
+            sample.add(data)
+
+    def _redetect(self, rate, previous, timeout):
+        """
+        Finds the rate the device went to instead of `rate`. Returns it, or
+        None (leaving the port at `rate`) if nothing looked right in time.
+        """
+        def read(size, dwell):
+            # What is buffered arrived at the rate tried before
+            self._reader.read(1 << 20, 0)
+            return bytes(self._sample(dwell, size).data)
+
+        started = time.monotonic()
+        found, sample = baud.detect(self._comms,
+                                    baud.candidates(rate, previous),
+                                    timeout=timeout, read=read,
+                                    cancelled=lambda: self._closing)
+
+        if found is None:
+            self._comms.baudrate = rate
+        else:
+            self._stream.feed(sample)
+
+        self.metrics.record('baud', time.monotonic() - started, str(found),
+                            len(sample), found is not None)
+
+        return found
+
+    def send_paced(self, text):
+        """
+        Sends a large block of text, such as a configuration, no faster than
+        the device echoes it. Blocks until it has all been sent.
+        """
+        with self._pasteLock:
+            PacedSender(self._reader, self.send_raw,
+                        self._comms.baudrate).send(text)
+
+    def wait(self, message, timeout=None):
+        pattern = self._compile(re.escape(message))
+        text, _ = self._expect(pattern, timeout)
+        return text.decode('utf-8', 'replace')
+
+    def ewait(self, expression, timeout=None):
+        text, _ = self._expect(self._compile(expression), timeout)
+        return text.decode('utf-8', 'replace')
+
+    def expect(self, patterns, literal=False, timeout=None):
+        """
+        Waits for the first of several patterns.
+
+        Returns the index of the pattern that matched, its match object and
+        the text received since the previous match. Matching is performed on
+        the raw bytes, so the match object and its groups are bytes.
+        """
+        if literal:
+            patterns = [re.escape(x) for x in patterns]
+
+        patterns = self._compile(tuple(patterns))
+        text, match = self._expect(patterns, timeout)
+        index, match = patterns.resolve(match)
+
+        return index, match, text.decode('utf-8', 'replace')
+
+    def converse(self, dialogue, state=None, timeout=None):
+        """
+        Runs a `bits.machine.Dialogue` from `state` (by default its start)
+        until it ends, and returns the text received meanwhile. `timeout`
+        applies to each prompt.
+        """
+        conversation = Conversation(dialogue, self, state)
+        received = []
+
+        while not conversation.finished:
+            text, match = self._expect(conversation.pattern(), timeout)
+            received.append(text)
+            conversation.advance(match)
+
+        return b''.join(received).decode('utf-8', 'replace')
+
+    def _compile(self, expression):
+        # Compiled patterns are cached per script class
+        cache = self.__class__.__dict__.get('_patterns')
+
+        if cache is None:
+            cache = {}
+            setattr(self.__class__, '_patterns', cache)
+
+        if expression not in cache:
+            if isinstance(expression, tuple):
+                cache[expression] = PatternSet(expression)
+            else:
+                cache[expression] = Pattern(expression)
+
+        return cache[expression]
+
+    def _timeout(self, timeout):
+        """
+        Seconds the next wait may take: the given or default timeout, cut
+        short by the script deadline. None means no limit.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        if self.deadline is not None:
+            if self._started is None:
+                self._started = time.monotonic()
+
+            left = max(0, self._started + self.deadline - time.monotonic())
+            timeout = left if timeout is None else min(timeout, left)
+
+        return timeout
+
+    def _record(self, pattern, started, consumed):
+        # Nothing is consumed when the wait times out
+        self.metrics.record('wait', time.monotonic() - started, str(pattern),
+                            len(consumed or b''), consumed is not None)
+
+    def _expect(self, pattern, timeout=None):
+        timeout = self._timeout(timeout)
+        started = time.monotonic()
 
-            if datalen > 0:
-                buffer += data
-                bufflen += datalen
+        while True:
+            found = self._stream.search(pattern)
+            if found is not None:
+                self._record(pattern, started, found[0])
+                return found
+
+            if self._closing:
+                raise SystemExit()
+
+            left = None
+            if timeout is not None:
+                left = started + timeout - time.monotonic()
 
-                # update buffer
-                wx.PostEvent(self.frame, SerialEvent(data))
+                if left <= 0:
+                    self._record(pattern, started, None)
+                    raise ExpectTimeout(str(pattern), timeout,
+                                        self._stream.tail())
 
-                search = expr.search(self._lastbuffer + buffer)
-                if (search is not None):
-                    self._lastbuffer = buffer[search.span()[1]:]
-                    break
+            data = self._reader.read(1024, left)
 
-        return buffer
+            if len(data) > 0:
+                self._stream.feed(data)
+            elif self._reader.closed:
+                raise SystemExit()
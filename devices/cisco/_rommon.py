@@ -0,0 +1,41 @@
+from bits.machine import Dialogue
+
+# Console rates, by their number in the confreg menu
+RATES = (9600, 4800, 1200, 2400, 19200, 38400, 57600, 115200)
+
+
+def _change_baud(script, match):
+    # Takes effect when ROMMON next resets; see Base.escalating
+    if script.escalating() and script.fastBaud in RATES:
+        script.send('y')
+    else:
+        script.send('')
+
+
+def _rate(script, match):
+    script.send(str(RATES.index(script.fastBaud)))
+
+
+# ROMMON `confreg`, answered to ignore the startup configuration on the next
+# boot. Start it by sending "confreg". ROMMON buffers what is typed, so a few
+# answers are sent ahead rather than one per round trip.
+CONFREG = Dialogue('confreg', [
+    ('change', 'change the configuration\\? y/n  \\[[yn]\\]:', 'y',
+     'diagnostic'),
+    ('diagnostic', '"diagnostic mode"\\? y/n  \\[[yn]\\]:', '', 'bcast'),
+    ('bcast', '"use net in IP bcast address"\\? y/n  \\[[yn]\\]:', '',
+     'netboot'),
+    ('netboot', '"load rom after netboot fails"\\? y/n  \\[[yn]\\]:', '',
+     'zero'),
+    ('zero', '"use all zero broadcast"\\? y/n  \\[[yn]\\]:', '', 'break'),
+    ('break', '"break/abort has effect"\\? y/n  \\[[yn]\\]:', '', 'ignore'),
+    ('ignore', '"ignore system config info"\\? y/n  \\[[yn]\\]:', 'y', 'baud'),
+    # The rate is only asked for if the baud rate is to change; otherwise
+    # the boot prompt arrives instead and is answered out of order
+    ('baud', 'change console baud rate\\? y/n  \\[[yn]\\]:', _change_baud,
+     'rate'),
+    ('rate', 'enter rate: [^[]*\\[\\d\\]:', _rate, 'boot'),
+    ('boot', 'change the boot characteristics\\? y/n  \\[[yn]\\]:', '',
+     'save'),
+    ('save', 'save this configuration\\? y/n  \\[[yn]\\]:', 'y', None),
+], typeahead=4)
@@ -1,8 +1,9 @@
-import re
 from ..Base import Base
 
 
 class asa55xx(Base):
+    pagers = (('<--- More --->', ' '),)
+
     def execute(self):
         """ Written for Cisco 5550 """
         self.prompt("Power on the device after clicking 'OK'.")
@@ -18,46 +19,38 @@ class asa55xx(Base):
         self.ewait('rommon #\\d{1,2}>')
         self.send('boot')
 
-        out = self.ewait('|'.join(list(map(re.escape, [
+        index, _, _ = self.expect([
             "Type help or '?' for a list of available commands.",
             "Pre-configure Firewall now through interactive prompts [yes]?"
-        ]))))
+        ], literal=True)
 
-        if not out.rfind('Pre-configure Firewall') == -1:
+        if index == 1:
             self.send('n')
-            out = self.wait("help or '?' for a list of available commands.")
+            self.wait("help or '?' for a list of available commands.")
 
-        # It could have been captured by the previous wait
-        if out.rfind('ciscoasa') == -1:
-            out = self.ewait('^ciscoasa[>#])$')
+        index, _, _ = self.expect(['ciscoasa>', 'ciscoasa#'], literal=True)
 
         # We probably aren't enabled
-        if out.rfind('ciscoasa>'):
+        if index == 0:
             self.send('en')
             self.wait('Password:')
             self.send_raw(self.ENTER)
             self.wait('ciscoasa#')
 
         self.send('write erase')
-        out = self.wait('[confirm]')
-
-        if out.rfind('[OK]') == -1:
-            self.send_raw('y')
-            out = self.wait('[OK]')
-
-        if out.rfind('ciscoasa#') == -1:
-            self.wait('ciscoasa#')
+        self.wait('[confirm]')
+        self.send_raw('y')
+        self.wait('[OK]')
+        self.wait('ciscoasa#')
 
         self.send('configure terminal')
-        out = self.ewait('|'.join(list(map(re.escape, [
-            "Help to improve",
-            'ciscoasa(config)# $'
-        ]))))
-
-        if not out.rfind('Help to improve the ASA platform') == -1:
-            if out.rfind('[Y]es, [N]o, [A]sk later:') == -1:
-                self.wait('[Y]es, [N]o, [A]sk later:')
+        index, _, _ = self.expect([
+            'Help to improve the ASA platform',
+            'ciscoasa(config)#'
+        ], literal=True)
 
+        if index == 0:
+            self.wait('[Y]es, [N]o, [A]sk later:')
             self.send('n')
             self.wait('ciscoasa(config)#')
 
@@ -1,4 +1,3 @@
-import re
 from ..Base import Base
 
 
@@ -14,19 +13,19 @@ class rt7000(Base):
         self.ewait('rommon \\d{1,2} >')
         self.send('reset')
 
-        out = self.ewait('|'.join(list(map(re.escape, [
+        index, _, _ = self.expect([
             'initial configuration dialog? [yes/no]:',
             'Press RETURN to get started!'
-        ]))))
+        ], literal=True)
 
-        if out.rfind('get started!') == -1:
+        if index == 0:
             self.send('n')
             self.wait('Press RETURN to get started!')
 
         self.send_raw('\r\n')
-        out = self.ewait('Router[>#]')
+        index, _, _ = self.expect(['Router>', 'Router#'], literal=True)
 
-        if out.rfind('Router#') == -1:
+        if index == 0:
             self.send('enable')
             self.wait('Router#')
 
@@ -35,7 +34,7 @@ class rt7000(Base):
             self.wait('Delete filename [%s-config]?' % cfg)
             self.send('')
 
-            self.wait('Delete nvram:/%s-config? [confirm]')
+            self.wait('Delete nvram:/%s-config? [confirm]' % cfg)
             self.send('y')
 
             self.wait('Router#')
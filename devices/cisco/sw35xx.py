@@ -1,8 +1,9 @@
-import re
 from ..Base import Base
 
 
 class sw35xx(Base):
+    pagers = (('-- MORE --', ' '),)
+
     def execute(self):
         """ Written for Cisco 3560 """
 
@@ -13,49 +14,29 @@ class sw35xx(Base):
 
         self.wait('switch: ')
         self.send('set')
-        while 1:
-            out = self.ewait('|'.join(list(map(re.escape, [
-                'switch: ',
-                '-- MORE --'
-            ]))))
-
-            if out.rfind('-- MORE --') == -1:
-                break
+        out = self.wait('switch: ')
 
-            if out.rfind('SWITCH_NUMBER=') <> -1:
-                self.send('unset SWITCH_NUMBER')
-                break
+        if out.rfind('SWITCH_NUMBER=') != -1:
+            self.send('unset SWITCH_NUMBER')
+            self.wait('switch: ')
 
         self.send('flash_init')
-        while 1:
-            out = self.ewait('|'.join(list(map(re.escape, [
-                'switch: ',
-                '-- MORE --'
-            ]))))
-
-            if out.rfind('-- MORE --') == -1:
-                break
-
-            self.send_raw(' ')
+        self.wait('switch: ')
 
         self.send('del flash:/config.text')
         self.wait('delete "flash:/config.text" (y/n)?')
         self.send("y")
-        out = self.ewait('|'.join(list(map(re.escape, [
+        self.expect([
             'File "flash:/config.text" deleted',
             'File "flash:/config.text" not deleted'
-        ]))))
-
-        if out.rfind('switch:') == -1:
-            self.wait('switch:')
+        ], literal=True)
+        self.wait('switch:')
 
         self.send('del flash:/vlan.dat')
         self.wait('delete "flash:/vlan.dat" (y/n)?')
         self.send("y")
-        out = self.ewait('|'.join(list(map(re.escape, [
+        self.expect([
             'File "flash:/vlan.dat" deleted',
             'File "flash:/vlan.dat" not deleted'
-        ]))))
-
-        if out.rfind('switch:') == -1:
-            self.wait('switch:')
+        ], literal=True)
+        self.wait('switch:')
@@ -1,47 +1,58 @@
-import re
 import time
 from ..Base import Base
+from ._rommon import CONFREG
 
 
 class sw49xx(Base):
+    pagers = (('--More--', ' '),)
+    fastBaud = 115200
+
     def execute(self):
         """ Written for Cisco 4948 """
         self.prompt("Power on the device after clicking 'OK'.")
 
-        out = self.ewait('|'.join(list(map(re.escape, [
+        index, _, _ = self.expect([
             'Type control-C to prevent autobooting.',
             'rommon'
-        ]))))
+        ], literal=True)
 
         # Not all devices will autoboot, some go directly into rommon
-        if not out.rfind('prevent autobooting') == -1:
+        if index == 0:
             self.send_raw(self.CTRL_C)
             self.ewait('rommon \\d{1,2} >')
 
+        fast = self.escalating()
+
         self.configure_register()
         self.ewait('rommon \\d{1,2} >')
         self.send('reset')
+
+        if fast:
+            # The new rate takes effect as ROMMON resets, and is saved
+            self.wait('Resetting')
+            self.change_baud(self.fastBaud, timeout=10, committed=True)
+
         time.sleep(2)
 
         # It *may* go back into rommon here
-        out = self.ewait('|'.join(list(map(re.escape, [
+        index, _, _ = self.expect([
             'Press RETURN to get started!',
             'rommon'
-        ]))))
+        ], literal=True)
 
         # It did go back into rommon - force a reboot
-        if not out.rfind('rommon') == -1:
+        if index == 1:
             self.send('boot')
             self.wait('Press RETURN to get started!')
 
         self.send_raw('\r')
-        out = self.ewait('Switch[#>]')
+        index, _, _ = self.expect(['Switch#', 'Switch>'])
 
-        if not out.rfind('Switch>') == -1:
+        if index == 1:
             self.send('enable')
-            out = self.ewait('Switch#|Password:')
+            index, _, _ = self.expect(['Switch#', 'Password:'])
 
-        if not out.rfind('Password:') == -1:
+        if index == 1:
             self.send_raw(self.ENTER)
             self.ewait('Switch#')
 
@@ -60,23 +71,4 @@ class sw49xx(Base):
 
     def configure_register(self):
         self.send('confreg')
-        self.ewait('change the configuration\\? y\\/n  \\[[yn]\\]:')
-        self.send('y')
-        self.ewait('"diagnostic mode"\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('"use net in IP bcast address"\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('"load rom after netboot fails"\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('"use all zero broadcast"\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('"break\\/abort has effect"\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('"ignore system config info"\\? y\\/n  \\[[yn]\\]:')
-        self.send('y')
-        self.ewait('change console baud rate\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('change the boot characteristics\\? y\\/n  \\[[yn]\\]:')
-        self.send_raw(self.ENTER)
-        self.ewait('save this configuration\\? y\\/n  \\[[yn]\\]:')
-        self.send('y')
+        self.converse(CONFREG)
@@ -6,6 +6,8 @@ def u(str):
 
 
 class Force10(Base):
+    pagers = (('--More--', ' '),)
+
     def execute(self):
         """ Written for Dell Force10 """
         self.prompt("Power on the device after clicking 'OK'.")
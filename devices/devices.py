@@ -1,29 +1,116 @@
+import os
 import sys
+import json
+import pkgutil
 import importlib
+from importlib.metadata import entry_points
+
+# Device modules are only imported once selected. Frozen (PyInstaller)
+# builds cannot scan the package, so they rely on the bundled manifest; run
+# this module before building to refresh it.
+MANIFEST = os.path.join(os.path.dirname(__file__), 'manifest.json')
+
+# Third-party packages may register devices as "make.model = module:Class"
+ENTRY_POINTS = 'killswitch.devices'
+
+_registered = None
+
+
+def _signature():
+    """
+    Modification times of everything that can add or remove a device: the
+    device directories, and the import path where plugins are installed.
+    """
+    root = os.path.dirname(__file__)
+    paths = [os.path.join(root, x) for x in sorted(os.listdir(root))
+             if not x.startswith('_')]
+    paths += sys.path
+
+    return [[x, os.stat(x).st_mtime] for x in paths if os.path.isdir(x)]
+
+
+def _scan():
+    root = os.path.dirname(__file__)
+    found = {}
+
+    # Convention: devices/<make>/<model>.py defines the class <model>
+    for make in sorted(os.listdir(root)):
+        path = os.path.join(root, make)
+
+        if not os.path.isdir(path) or make.startswith('_'):
+            continue
+
+        for module in pkgutil.iter_modules([path]):
+            # Shared helpers, such as dialogues, are not devices
+            if module.name.startswith('_'):
+                continue
+
+            found['%s.%s' % (make, module.name)] = 'devices.%s.%s:%s' % (
+                make, module.name, module.name)
+
+    for entry in entry_points(group=ENTRY_POINTS):
+        found[entry.name] = entry.value
+
+    return found
+
+
+def _load():
+    try:
+        with open(MANIFEST) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        manifest = None
+
+    if manifest is not None and getattr(sys, 'frozen', False):
+        return manifest['devices']
+
+    signature = _signature()
+
+    if manifest is not None and manifest['signature'] == signature:
+        return manifest['devices']
+
+    return refresh(signature)
+
+
+def refresh(signature=None):
+    """
+    Rescans for devices and rewrites the manifest.
+    """
+    global _registered
+
+    _registered = _scan()
+
+    try:
+        with open(MANIFEST, 'w') as fh:
+            json.dump({
+                'signature': signature or _signature(),
+                'devices': _registered
+            }, fh, indent=1, sort_keys=True)
+    except OSError:
+        # Read-only installation; scan again next time
+        pass
+
+    return _registered
+
+
+def names():
+    global _registered
+
+    if _registered is None:
+        _registered = _load()
+
+    return sorted(_registered)
 
-# Now we include all devices... Thanks, PyInstaller!
-import devices.cisco.asa55xx
-import devices.cisco.rt7000
-import devices.cisco.sw29xx
-import devices.cisco.sw35xx
-import devices.cisco.sw37xx
-import devices.cisco.sw45xx
-import devices.cisco.sw49xx
-import devices.dell.Force10
 
 def get(name):
-    registered = {
-        'cisco.asa55xx': devices.cisco.asa55xx.asa55xx,
-        'cisco.rt7000': devices.cisco.rt7000.rt7000,
-        'cisco.sw29xx': devices.cisco.sw29xx.sw29xx,
-        'cisco.sw35xx': devices.cisco.sw35xx.sw35xx,
-        'cisco.sw37xx': devices.cisco.sw37xx.sw37xx,
-        'cisco.sw45xx': devices.cisco.sw45xx.sw45xx,
-        'cisco.sw49xx': devices.cisco.sw49xx.sw49xx,
-        'dell.Force10': devices.dell.Force10.Force10,
-    }
-
-    if name in registered:
-        return registered[name]
-
-    raise LookupError('Device "%s" not supported' % name)
+    if name not in names():
+        raise LookupError('Device "%s" not supported' % name)
+
+    module, attr = _registered[name].split(':')
+
+    return getattr(importlib.import_module(module), attr)
+
+
+if __name__ == '__main__':
+    for name in sorted(refresh()):
+        print(name)
@@ -13,7 +13,7 @@ from serial.serialutil import SerialException
 locale.setlocale(locale.LC_ALL, '')
 
 options = ['%s' % x for x in helpers.get_serial_ports()]
-supported = helpers.get_supported_devices()
+supported = [x.replace('.', '/', 1) for x in devices.names()]
 
 wx.App()
 
@@ -27,7 +27,9 @@ port = selected.get('comms')
 baud = selected.get('baud')
 
 try:
-    cereal = serial.Serial(port, baud, timeout=0.1)
+    # No timeout; reads block on the reader thread until data arrives. The
+    # rate is detected later if it was left on auto.
+    cereal = serial.Serial(port, baud or 9600)
 except SerialException as ex:
     dialog = wx.MessageDialog(None, 'Serial Error: {0}'.format(ex))
     dialog.ShowModal()
@@ -39,6 +41,7 @@ except SerialException as ex:
 chosen = selected.get('device')
 device = devices.get(chosen)
 device = device()
+device.autoBaud = baud is None
 
 # Give comms to the device and start running commands
 device.setCommsPort(cereal)
@@ -0,0 +1,59 @@
+import random
+import unittest
+from bits.pager import Pager
+
+# As IOS prints a page break: the prompt, then once it is answered, the
+# prompt wiped out with backspaces and spaces
+PAGE = b' --More-- ' + b'\x08' * 10 + b' ' * 10 + b'\x08' * 10
+TEXT = (b'Switch#show running-config\r\nBuilding configuration...\r\n' +
+        PAGE + b'  interface Vlan1\r\n   no ip address\r\n' +
+        PAGE + b'end\r\n\r\nSwitch#')
+EXPECTED = (b'Switch#show running-config\r\nBuilding configuration...\r\n'
+            b'interface Vlan1\r\n   no ip address\r\nend\r\n\r\nSwitch#')
+
+
+class PagerTest(unittest.TestCase):
+    def filter(self, chunks):
+        answers = []
+        pager = Pager((('--More--', ' '),), answers.append)
+        filtered = b''.join(pager.filter(x) for x in chunks)
+
+        return filtered, answers
+
+    def chunked(self, sizes):
+        chunks = []
+        start = 0
+
+        for size in sizes:
+            chunks.append(TEXT[start:start + size])
+            start += size
+
+        return chunks
+
+    def test_whole(self):
+        self.assertEqual(self.filter([TEXT]), (EXPECTED, [' ', ' ']))
+
+    def test_byte_by_byte(self):
+        chunks = [TEXT[i:i + 1] for i in range(len(TEXT))]
+        self.assertEqual(self.filter(chunks), (EXPECTED, [' ', ' ']))
+
+    def test_random_chunks(self):
+        rand = random.Random(0)
+
+        for _ in range(500):
+            sizes = [rand.randint(1, 16) for _ in range(len(TEXT))]
+            self.assertEqual(self.filter(self.chunked(sizes)),
+                             (EXPECTED, [' ', ' ']))
+
+    def test_no_erase(self):
+        # Consoles that do not erase the prompt just carry on
+        self.assertEqual(self.filter([b'a\r\n--More--', b'b\r\n']),
+                         (b'a\r\nb\r\n', [' ']))
+
+    def test_trailing_space_not_held(self):
+        # Only spaces that could pad a prompt wait for more data
+        self.assertEqual(self.filter([b'Password: ']), (b'Password: ', []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import time
+import unittest
+from threading import Thread
+from bits.replay import ReplaySerial
+from bits.replay import load
+from bits.replay import run
+from devices import devices
+
+TRANSCRIPTS = os.path.join(os.path.dirname(__file__), 'transcripts')
+
+
+class ReplayTest(unittest.TestCase):
+    def replay(self, name, device):
+        port = ReplaySerial(os.path.join(TRANSCRIPTS, name + '.cast.gz'))
+        script = run(devices.get(device)(), port)
+
+        return script, port
+
+    def test_sw45xx(self):
+        script, port = self.replay('sw45xx', 'cisco.sw45xx')
+
+        self.assertTrue(port.finished)
+        self.assertTrue(all(x.matched for x in script.metrics.events
+                            if x.step == 'wait'))
+
+    def test_sends_what_was_recorded(self):
+        # Byte for byte, so that sending the wrong key (control-C rather
+        # than ESC, say) to interrupt the boot is caught
+        path = os.path.join(TRANSCRIPTS, 'sw45xx.cast.gz')
+        recorded = b''.join(x for _, code, x in load(path) if code == 'i')
+
+        port = ReplaySerial(path)
+        sent = bytearray()
+        write = port.write
+        port.write = lambda data: sent.extend(data) or write(data)
+        run(devices.get('cisco.sw45xx')(), port)
+
+        self.assertEqual(bytes(sent), recorded)
+        self.assertEqual(port.written, len(recorded))
+
+    def test_cancel_before_read(self):
+        # As SerialReader.close() may cancel just before the thread reads
+        port = ReplaySerial([(0.0, 'i', b'x'), (0.0, 'o', b'y')])
+        port.cancel_read()
+
+        self.assertEqual(port.read(), b'')
+
+        # The cancel was consumed
+        port.write(b'x')
+        self.assertEqual(port.read(), b'y')
+
+    def test_cancel_during_read(self):
+        port = ReplaySerial([(0.0, 'i', b'x'), (0.0, 'o', b'y')])
+        result = []
+
+        reader = Thread(target=lambda: result.append(port.read()))
+        reader.start()
+        time.sleep(0.05)
+        port.cancel_read()
+        reader.join(5)
+
+        self.assertEqual(result, [b''])
+
+
+if __name__ == '__main__':
+    unittest.main()